@@ -0,0 +1,4 @@
+"""抽取、提纯、融合各阶段脚本共用的工具模块
+
+脚本通过将仓库根目录加入 sys.path 后以 ``from common.xxx import ...`` 的方式引用。
+"""
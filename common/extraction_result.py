@@ -0,0 +1,167 @@
+import json
+import re
+
+ENTITY_TYPES = ("enterprise", "person", "location", "project")
+
+# 方括号格式中的字段标签，如 "enterprise:..., triplet:(a, rel, b)"
+_SECTION_PATTERN = re.compile(r"\b(enterprise|person|location|project|triplet)\s*[:：]", re.IGNORECASE)
+_ENTITY_SPLIT_PATTERN = re.compile(r"[,，、;；\n]")
+_NULL_VALUES = {"", "null", "none", "无", "[null]"}
+
+
+def empty_result():
+    return {"entities": {entity_type: [] for entity_type in ENTITY_TYPES}, "triplet": []}
+
+
+def format_triple(parts):
+    """将三元组各部分规范化为 "(主语, 关系, 宾语)" 字符串"""
+    return f"({', '.join(part.strip() for part in parts)})"
+
+
+def _normalize_triple(triple):
+    """统一三元组表示：列表或逗号分隔的字符串均转成 "(a, rel, b)"，无法拆分的保持原样"""
+    if isinstance(triple, (list, tuple)):
+        return format_triple(str(part) for part in triple) if len(triple) == 3 else None
+    if not isinstance(triple, str):
+        return None
+    text = triple.strip()
+    inner = text[1:-1] if text.startswith("(") and text.endswith(")") else text
+    parts = [part.strip() for part in inner.split(",")]
+    if len(parts) == 3 and all(parts):
+        return format_triple(parts)
+    return f"({inner.strip()})" if inner.strip() else None
+
+
+def _clean_entity(entity):
+    entity = str(entity).strip().strip("[]").strip()
+    # 只去掉包住整个名称的引号，名称内部的引号（如 Dự án 'Smart City'）保留
+    while len(entity) >= 2 and entity[0] == entity[-1] and entity[0] in "'\"":
+        entity = entity[1:-1].strip()
+    return None if entity.lower() in _NULL_VALUES else entity
+
+
+def _iter_parenthesized(text):
+    """逐个产出顶层括号内的内容，括号可以嵌套，如 "(A, branch, Công ty (VN) X)" 产出整个三元组"""
+    depth, start = 0, None
+    for i, char in enumerate(text):
+        if char == "(":
+            if depth == 0:
+                start = i + 1
+            depth += 1
+        elif char == ")" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                yield text[start:i]
+
+
+def _parse_json(text):
+    """解析 JSON 格式的抽取结果，兼容 ```json 代码块与缺失外层花括号的输出"""
+    start, end = text.find("{"), text.rfind("}")
+    candidates = []
+    if start != -1 and end > start:
+        candidates.append(text[start:end + 1])
+    # 提示词中的示例格式缺少开头的 {" ，模型照抄时补齐
+    key_start = text.find('entities"')
+    if key_start != -1:
+        tail = max(text.rfind("}"), text.rfind("]"))
+        candidates.append('{"' + text[key_start:tail + 1] + "}")
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict) and ("entities" in data or "triplet" in data):
+            return data
+    return None
+
+
+def _from_json(data):
+    result = empty_result()
+    entities = data.get("entities") or {}
+    if isinstance(entities, dict):
+        for entity_type, values in entities.items():
+            if isinstance(values, str):
+                values = [values]
+            cleaned = [_clean_entity(value) for value in values or []]
+            result["entities"].setdefault(entity_type, []).extend(e for e in cleaned if e)
+    triples = data.get("triplet") or []
+    if isinstance(triples, str):
+        # 模型把三元组列表写成一个字符串，如 "(A, rel, B), (C, rel, D)"，按括号拆开
+        triples = [f"({inner})" for inner in _iter_parenthesized(triples)]
+    elif not isinstance(triples, list):
+        triples = []
+    for triple in triples:
+        normalized = _normalize_triple(triple)
+        if normalized:
+            result["triplet"].append(normalized)
+    return result
+
+
+def _from_brackets(text):
+    matches = list(_SECTION_PATTERN.finditer(text))
+    if not matches:
+        return None
+    result = empty_result()
+    for i, match in enumerate(matches):
+        label = match.group(1).lower()
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        body = text[match.end():end]
+        if label == "triplet":
+            for inner in _iter_parenthesized(body):
+                normalized = _normalize_triple(f"({inner})")
+                if normalized:
+                    result["triplet"].append(normalized)
+        else:
+            cleaned = [_clean_entity(value) for value in _ENTITY_SPLIT_PATTERN.split(body)]
+            result["entities"][label].extend(e for e in cleaned if e)
+    return result
+
+
+def parse_extraction(text):
+    """将模型返回的抽取结果解析为 {"entities": {类型: [...]}, "triplet": [...]}
+
+    同时支持 JSON 格式与方括号格式（也接受已解码的 dict），模型输出 null 时返回空结果，
+    无法解析时返回 None。
+    """
+    if isinstance(text, dict):
+        return _from_json(text)
+    if not isinstance(text, str):
+        return None
+    if text.strip().strip("[]").strip().lower() in _NULL_VALUES:
+        return empty_result()
+    data = _parse_json(text)
+    if data is not None:
+        return _from_json(data)
+    return _from_brackets(text)
+
+
+def merge_extractions(results):
+    """合并多个抽取结果，实体与三元组按出现顺序去重"""
+    merged = empty_result()
+    seen_entities = {}
+    seen_triples = set()
+    for result in results:
+        for entity_type, entities in result["entities"].items():
+            seen = seen_entities.setdefault(entity_type, set())
+            for entity in entities:
+                if entity not in seen:
+                    seen.add(entity)
+                    merged["entities"].setdefault(entity_type, []).append(entity)
+        for triple in result["triplet"]:
+            if triple not in seen_triples:
+                seen_triples.add(triple)
+                merged["triplet"].append(triple)
+    return merged
+
+
+def article_extraction(article):
+    """读取文章的抽取结果，统一为 {"entities": {...}, "triplet": [...]}
+
+    兼容顶层 entities/triplet 字段、结构化的 entity_relationship 以及旧版原样保存的模型输出字符串，
+    都没有或无法解析时返回空结果。
+    """
+    if "entities" in article or "triplet" in article:
+        result = _from_json(article)
+    else:
+        result = parse_extraction(article.get("entity_relationship"))
+    return result if result is not None else empty_result()
@@ -0,0 +1,61 @@
+import json
+import re
+
+# 每次从文件读取的字符数
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def iter_json_array(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """流式读取顶层为数组的 JSON 文件，逐个产出数组元素
+
+    内存占用只与单个元素和读取块大小有关，而不是整个文件。
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        buffer = f.read(chunk_size)
+        eof = not buffer
+        pos = 0
+
+        def skip_whitespace():
+            nonlocal buffer, pos, eof
+            while True:
+                pos = _WHITESPACE.match(buffer, pos).end()
+                if pos < len(buffer) or eof:
+                    return
+                buffer, pos = f.read(chunk_size), 0
+                eof = not buffer
+
+        skip_whitespace()
+        if pos >= len(buffer) or buffer[pos] != '[':
+            raise ValueError(f"{path} 的顶层不是 JSON 数组")
+        pos += 1
+
+        while True:
+            skip_whitespace()
+            if pos >= len(buffer):
+                raise ValueError(f"{path} 在数组结束前意外终止")
+            if buffer[pos] == ']':
+                return
+            if buffer[pos] == ',':
+                pos += 1
+                continue
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # 元素之后必须紧跟 , 或 ]，否则可能在块边界处被截断（如数字 2.5 只读到 2），需读入更多内容
+                following = _WHITESPACE.match(buffer, end).end()
+                if not eof and (following >= len(buffer) or buffer[following] not in ',]'):
+                    raise json.JSONDecodeError("元素可能被截断", buffer, end)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = f.read(chunk_size)
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            yield item
+            pos = end
+            # 丢弃已解析的内容，避免缓冲区无限增长
+            if pos > chunk_size:
+                buffer, pos = buffer[pos:], 0
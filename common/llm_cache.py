@@ -0,0 +1,217 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common.rate_limiter import acall_with_rate_limit, call_with_rate_limit
+
+# 默认缓存位置：仓库根目录下的 .cache/
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "llm_cache.sqlite"
+)
+# 缓存总大小上限（字节），超出后按最近访问时间淘汰
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+# 命中时的访问时间先记在内存中，累计条数或间隔秒数达到上限时批量写入，避免每次命中都提交一次事务
+ACCESS_FLUSH_SIZE = 500
+ACCESS_FLUSH_INTERVAL = 30.0
+
+
+class LLMCache:
+    """基于 SQLite 的 LLM 响应缓存
+
+    键为 model、temperature、messages、response_format 等请求参数的哈希，值为模型返回的
+    文本。超出 max_bytes 后按 LRU 淘汰，并记录命中/未命中次数。
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending_access = {}
+        self._last_flush = time.monotonic()
+        self._closed = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        # 进程退出时写入尚未保存的访问时间
+        atexit.register(self.close)
+
+    @staticmethod
+    def make_key(**params):
+        """根据请求参数生成缓存键（忽略 stream 等不影响结果的参数）"""
+        params.pop("stream", None)
+        payload = json.dumps(params, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._pending_access[key] = time.time()
+            if (len(self._pending_access) >= ACCESS_FLUSH_SIZE
+                    or time.monotonic() - self._last_flush >= ACCESS_FLUSH_INTERVAL):
+                self._write_access()
+                self._conn.commit()
+            return json.loads(row[0])
+
+    def put(self, key, value):
+        """写入缓存，必要时淘汰最久未访问的条目"""
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        with self._lock:
+            # 与本次写入在同一事务中提交
+            self._write_access()
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self._total_bytes -= old[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, data, size, time.time())
+            )
+            self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _write_access(self):
+        """写入（不提交）内存中累计的访问时间，调用方需持有锁"""
+        if self._pending_access:
+            self._conn.executemany("UPDATE responses SET last_access = ? WHERE key = ?",
+                                   [(accessed, key) for key, accessed in self._pending_access.items()])
+            self._pending_access.clear()
+        self._last_flush = time.monotonic()
+
+    def _evict(self):
+        """淘汰最久未访问的条目，直到总大小降到上限的 90%"""
+        target = self.max_bytes * 0.9
+        while self._total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._total_bytes <= target:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "bytes": self._total_bytes,
+        }
+
+    def report(self):
+        stats = self.stats()
+        print(f"LLM 缓存: 命中 {stats['hits']} 次，未命中 {stats['misses']} 次，"
+              f"命中率 {stats['hit_rate']:.1%}，占用 {stats['bytes'] / 1024 ** 2:.1f} MB")
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._write_access()
+            self._conn.commit()
+            self._conn.close()
+            self._closed = True
+
+
+def cached_chat_completion(client, cache, sample=None, rate_limiter=None, **params):
+    """带缓存的同步 chat completion，返回响应文本
+
+    sample 用于区分同一请求的多次采样（如提纯阶段的多次投票），使每次采样各自缓存；
+    传入 rate_limiter（common.rate_limiter.AdaptiveRateLimiter）时未命中的请求受其限速。
+    """
+    key = cache.make_key(sample=sample, **params)
+    content = cache.get(key)
+    if content is None:
+        if rate_limiter is not None:
+            response = call_with_rate_limit(rate_limiter, client.chat.completions.create, **params)
+        else:
+            response = client.chat.completions.create(**params)
+        content = response.choices[0].message.content
+        cache.put(key, content)
+    return content
+
+
+def cached_chat_completions(client, cache, n, rate_limiter=None, **params):
+    """带缓存的多次采样，返回 n 个响应文本（顺序与 sample 编号 0..n-1 一致），请求失败的采样为 None
+
+    每个采样使用与 cached_chat_completion(sample=i) 相同的缓存键。未命中的采样先通过一次带 n 参数的
+    请求获取；该请求失败（如后端不支持 n）或后端忽略 n、返回的 choices 不足时，其余采样改为并行的单次请求。
+    每个采样收到后立即写入缓存，单个采样失败不影响其他采样。
+    """
+    keys = [cache.make_key(sample=i, **params) for i in range(n)]
+    contents = [cache.get(key) for key in keys]
+    missing = [i for i, content in enumerate(contents) if content is None]
+    if not missing:
+        return contents
+
+    def create(**extra):
+        if rate_limiter is not None:
+            return call_with_rate_limit(rate_limiter, client.chat.completions.create, **params, **extra)
+        return client.chat.completions.create(**params, **extra)
+
+    def fetch_one(i):
+        content = create().choices[0].message.content
+        cache.put(keys[i], content)
+        return content
+
+    choices = []
+    if len(missing) > 1:
+        try:
+            choices = [choice.message.content for choice in create(n=len(missing)).choices[:len(missing)]]
+        except Exception as e:
+            print(f"带 n 参数的采样请求失败，改为单次请求: {str(e)}")
+    for i, content in zip(missing, choices):
+        contents[i] = content
+        cache.put(keys[i], content)
+
+    remaining = missing[len(choices):]
+    if remaining:
+        with ThreadPoolExecutor(max_workers=len(remaining)) as executor:
+            futures = {i: executor.submit(fetch_one, i) for i in remaining}
+        for i, future in futures.items():
+            try:
+                contents[i] = future.result()
+            except Exception as e:
+                print(f"第 {i + 1} 次采样请求失败: {str(e)}")
+    return contents
+
+
+async def acached_chat_completion(client, cache, sample=None, rate_limiter=None, **params):
+    """带缓存的异步 chat completion，返回响应文本"""
+    key = cache.make_key(sample=sample, **params)
+    content = cache.get(key)
+    if content is None:
+        if rate_limiter is not None:
+            response = await acall_with_rate_limit(rate_limiter, client.chat.completions.create, **params)
+        else:
+            response = await client.chat.completions.create(**params)
+        content = response.choices[0].message.content
+        cache.put(key, content)
+    return content
@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+# 统计实际请求速率所用的时间窗口（秒）
+STATS_WINDOW = 10.0
+
+
+def is_throttle_error(error):
+    """判断异常是否来自限流（429）或服务端错误（5xx）
+
+    兼容 openai 的 APIStatusError（status_code）与 requests 的 HTTPError（response.status_code），
+    openai 的超时、连接错误也视为需要退避。
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is None:
+        return type(error).__name__ in ("RateLimitError", "APITimeoutError", "APIConnectionError")
+    return status == 429 or status >= 500
+
+
+class AdaptiveRateLimiter:
+    """AIMD 自适应限速器，同步与异步调用方共用
+
+    每次请求前通过 acquire / aacquire 按当前速率排队；请求成功时速率加性增长
+    （约每秒增加 increase 次/秒），遇到 429/5xx 时乘性下降为 decrease 倍，
+    cooldown 秒内的多次限流只下降一次。可选 max_tokens_per_second 限制 token 吞吐。
+    """
+
+    def __init__(self, initial_rate=5.0, min_rate=0.5, max_rate=100.0, increase=1.0, decrease=0.5,
+                 cooldown=1.0, max_tokens_per_second=None, name="llm"):
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.max_tokens_per_second = max_tokens_per_second
+        self.name = name
+
+        self.successes = 0
+        self.throttles = 0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._last_decrease = 0.0
+        self._token_level = max_tokens_per_second or 0.0
+        self._token_time = time.monotonic()
+        self._history = deque()  # (完成时间, token 数)
+
+    def _reserve(self, tokens):
+        """预约一个请求时间片，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot)
+            self._next_slot = start + 1.0 / self.rate
+            if self.max_tokens_per_second and tokens:
+                elapsed = now - self._token_time
+                self._token_level = min(self.max_tokens_per_second,
+                                        self._token_level + elapsed * self.max_tokens_per_second)
+                self._token_time = now
+                self._token_level -= tokens
+                if self._token_level < 0:
+                    start = max(start, now - self._token_level / self.max_tokens_per_second)
+            return start - now
+
+    def acquire(self, tokens=0):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens=0):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self, tokens=0):
+        """请求成功：加性增长"""
+        with self._lock:
+            self.successes += 1
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+            now = time.monotonic()
+            self._history.append((now, tokens))
+            while self._history and now - self._history[0][0] > STATS_WINDOW:
+                self._history.popleft()
+
+    def on_throttle(self):
+        """遇到限流或服务端错误：乘性下降，并推迟下一个时间片"""
+        with self._lock:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._last_decrease = now
+            self._next_slot = max(self._next_slot, now + 1.0 / self.rate)
+
+    def record_error(self, error):
+        """记录请求异常，属于限流类错误时触发退避并返回 True"""
+        if is_throttle_error(error):
+            self.on_throttle()
+            return True
+        return False
+
+    def stats(self):
+        with self._lock:
+            window = min(STATS_WINDOW, time.monotonic() - self._history[0][0]) if self._history else 0.0
+            count = len(self._history)
+            tokens = sum(t for _, t in self._history)
+            return {
+                "rate": self.rate,
+                "requests_per_second": count / window if window else 0.0,
+                "tokens_per_second": tokens / window if window else 0.0,
+                "successes": self.successes,
+                "throttles": self.throttles,
+            }
+
+    def report(self):
+        stats = self.stats()
+        print(f"限速器[{self.name}]: 当前速率 {stats['rate']:.1f} 次/秒，近期 {stats['requests_per_second']:.1f} 次/秒、"
+              f"{stats['tokens_per_second']:.0f} tokens/秒，成功 {stats['successes']} 次，限流 {stats['throttles']} 次")
+
+
+def _usage_tokens(result):
+    """从 openai 响应中读取 token 用量，取不到时返回 0"""
+    return getattr(getattr(result, "usage", None), "total_tokens", 0) or 0
+
+
+def call_with_rate_limit(limiter, func, *args, max_retries=5, tokens=0, **kwargs):
+    """在限速器控制下同步调用 func，限流类错误自动退避重试"""
+    for attempt in range(max_retries + 1):
+        limiter.acquire(tokens)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if limiter.record_error(e) and attempt < max_retries:
+                continue
+            raise
+        limiter.on_success(_usage_tokens(result))
+        return result
+
+
+async def acall_with_rate_limit(limiter, func, *args, max_retries=5, tokens=0, **kwargs):
+    """在限速器控制下调用协程函数 func，限流类错误自动退避重试"""
+    for attempt in range(max_retries + 1):
+        await limiter.aacquire(tokens)
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            if limiter.record_error(e) and attempt < max_retries:
+                continue
+            raise
+        limiter.on_success(_usage_tokens(result))
+        return result
@@ -0,0 +1,84 @@
+import json
+import os
+
+
+class ResultStore:
+    """追加写入的 JSONL 结果日志
+
+    每处理完一篇文章追加一行 {"id": ..., "fields": {...}}，启动时从日志恢复已处理
+    文章，全部处理完成后再一次性合并写出最终 JSON 文件。进程中途被杀死时最多丢失
+    最后一行，不会出现写了一半的输出文件。
+    """
+
+    def __init__(self, output_file, id_key, journal_file=None):
+        self.output_file = output_file
+        self.id_key = id_key
+        self.journal_file = journal_file or f"{output_file}.jsonl"
+        self._journal = None
+
+    def load(self):
+        """读取日志，返回 {文章ID: 字段}，同一文章以最后一条记录为准"""
+        records = {}
+        if not os.path.exists(self.journal_file):
+            return records
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程被中断时最后一行可能不完整，跳过即可
+                    print(f"跳过日志中无法解析的第 {line_no} 行: {self.journal_file}")
+                    continue
+                if not (isinstance(record, dict) and "id" in record and isinstance(record.get("fields"), dict)):
+                    # 截断的行也可能恰好是合法 JSON（如数字），缺少 id/fields 时同样跳过
+                    print(f"跳过日志中缺少 id/fields 的第 {line_no} 行: {self.journal_file}")
+                    continue
+                records.setdefault(record["id"], {}).update(record["fields"])
+        return records
+
+    def restore(self, dataset):
+        """将日志中的结果合并回 dataset，返回恢复的文章数"""
+        records = self.load()
+        restored = 0
+        for article in dataset:
+            fields = records.get(article.get(self.id_key))
+            if fields:
+                article.update(fields)
+                restored += 1
+        if restored:
+            print(f"从日志 {self.journal_file} 恢复 {restored} 篇已处理文章")
+        return restored
+
+    def append(self, article_id, fields):
+        """追加一条处理结果并立即刷新到磁盘"""
+        if self._journal is None:
+            directory = os.path.dirname(self.journal_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._journal = open(self.journal_file, 'a', encoding='utf-8')
+            # 上次中断留下的不完整行需要先换行，避免与新记录粘连
+            if self._journal.tell() > 0 and not self._ends_with_newline():
+                self._journal.write("\n")
+        self._journal.write(json.dumps({"id": article_id, "fields": fields}, ensure_ascii=False) + "\n")
+        self._journal.flush()
+
+    def _ends_with_newline(self):
+        with open(self.journal_file, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def compact(self, dataset, indent=4):
+        """将完整数据写出为最终 JSON 文件（先写临时文件再原子替换）"""
+        self.close()
+        tmp_file = f"{self.output_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(dataset, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp_file, self.output_file)
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
@@ -0,0 +1,26 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+# 零宽字符（零宽空格、零宽（不）连接符、词连接符、BOM）
+_ZERO_WIDTH = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff"))
+# 全角 ASCII（U+FF01-U+FF5E）折叠为半角，全角空格折叠为普通空格
+_WIDTH_FOLD = {code: code - 0xFEE0 for code in range(0xFF01, 0xFF5F)}
+_WIDTH_FOLD[0x3000] = ord(" ")
+_TRANSLATION = {**_ZERO_WIDTH, **_WIDTH_FOLD}
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+# 三元组分隔符两侧的空白不影响语义
+_PUNCT_SPACE_PATTERN = re.compile(r"\s*([,()])\s*")
+
+
+@lru_cache(maxsize=1 << 18)
+def canonical_key(text):
+    """返回文本的规范化键，用于计数与去重（不用于输出）
+
+    依次做 NFC 规范化、去除零宽字符、全角转半角、合并空白，并去掉 , ( ) 两侧的空白，
+    使组合/分解形式的越南语声调、夹带零宽字符的泰语以及全角/半角标点得到相同的键。
+    """
+    text = unicodedata.normalize("NFC", text).translate(_TRANSLATION)
+    text = _WHITESPACE_PATTERN.sub(" ", text).strip()
+    return _PUNCT_SPACE_PATTERN.sub(r"\1", text)
@@ -0,0 +1,95 @@
+"""对比 ExampleSelector 不同分析器的训练耗时、内存占用与 top-k 召回率
+
+用法：python benchmark_example_selector.py <示例库.json> [--k 3] [--queries 500]
+
+召回率的计算方式：从每条示例中随机截取一段连续文本作为查询，统计原示例出现在
+top-k 结果中的比例；同时给出各分析器与当前默认（word）结果的 top-k 重合率。
+"""
+import argparse
+import json
+import os
+import pickle
+import random
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from example_selector import ExampleSelector
+
+ANALYZERS = ["word", "char_hash"]
+
+
+def make_queries(texts, n_queries, span_ratio, seed):
+    """随机截取示例内容的一段作为查询，返回 (查询文本, 原示例下标)"""
+    rng = random.Random(seed)
+    indices = rng.sample(range(len(texts)), min(n_queries, len(texts)))
+    queries = []
+    for idx in indices:
+        text = texts[idx]
+        span = max(1, int(len(text) * span_ratio))
+        start = rng.randint(0, max(0, len(text) - span))
+        queries.append(text[start:start + span])
+    return queries, np.array(indices)
+
+
+def benchmark(example_path, analyzer, k, queries, targets):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_path = os.path.join(tmp_dir, "index.pkl")
+        selector = ExampleSelector(example_path, k=k, index_path=index_path, analyzer=analyzer)
+
+        # 单独计时训练过程，并用 tracemalloc 统计训练期间的峰值内存
+        tracemalloc.start()
+        start = time.perf_counter()
+        selector._train_model()
+        fit_seconds = time.perf_counter() - start
+        _, fit_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        index_bytes = len(pickle.dumps((selector.vectorizer, selector.example_matrix),
+                                       protocol=pickle.HIGHEST_PROTOCOL))
+
+        start = time.perf_counter()
+        top_k = selector.select_indices_batch(queries)
+        query_seconds = time.perf_counter() - start
+
+    recall = float(np.mean([target in row for target, row in zip(targets, top_k)]))
+    return {
+        "fit_seconds": fit_seconds,
+        "fit_peak_mb": fit_peak / 1024 ** 2,
+        "index_mb": index_bytes / 1024 ** 2,
+        "query_ms": query_seconds * 1000 / max(1, len(queries)),
+        "recall": recall,
+        "top_k": top_k,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("example_path")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--span-ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.example_path, 'r', encoding='utf-8') as f:
+        texts = [ex['content'] for ex in json.load(f)]
+    queries, targets = make_queries(texts, args.queries, args.span_ratio, args.seed)
+    print(f"示例数 {len(texts)}，查询数 {len(queries)}，k={args.k}")
+
+    results = {analyzer: benchmark(args.example_path, analyzer, args.k, queries, targets)
+               for analyzer in ANALYZERS}
+
+    baseline = results["word"]["top_k"]
+    print(f"{'analyzer':<10} {'fit(s)':>8} {'fit峰值(MB)':>12} {'索引(MB)':>10} "
+          f"{'查询(ms)':>9} {'recall@k':>9} {'与word重合':>10}")
+    for analyzer, r in results.items():
+        overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(r["top_k"], baseline)])
+        print(f"{analyzer:<10} {r['fit_seconds']:>8.3f} {r['fit_peak_mb']:>12.1f} {r['index_mb']:>10.1f} "
+              f"{r['query_ms']:>9.3f} {r['recall']:>9.3f} {overlap:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import re
+
+# 中文、日韩文字与泰文：粗略按每个字符约 1 个 token 估算
+_DENSE_CHAR_PATTERN = re.compile(r"[\u0e00-\u0e7f\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+# 句子结束位置：中文标点、换行、后接空白的英文标点，以及泰文中分隔句子的空格
+_SENTENCE_END_PATTERN = re.compile(r"[。！？；\n]+|[.!?;]+(?=\s|$)|(?<=[\u0e00-\u0e7f])\s+")
+
+
+def estimate_tokens(text):
+    """估算文本的 token 数：密集文字按字计，其余字符约 4 个字符 1 个 token"""
+    dense = len(_DENSE_CHAR_PATTERN.findall(text))
+    return dense + (len(text) - dense + 3) // 4
+
+
+def split_sentences(text):
+    """按句子边界切分，返回各句在原文中的 (start, end) 位置"""
+    spans = []
+    start = 0
+    for match in _SENTENCE_END_PATTERN.finditer(text):
+        if match.end() > start and text[start:match.end()].strip():
+            spans.append((start, match.end()))
+        start = match.end()
+    if text[start:].strip():
+        spans.append((start, len(text)))
+    return spans
+
+
+def _split_long_span(text, span, max_tokens):
+    """将超长的单句按字符均分，使每段估算 token 数不超过上限"""
+    start, end = span
+    pieces = -(-estimate_tokens(text[start:end]) // max_tokens)
+    step = -(-(end - start) // pieces)
+    return [(pos, min(pos + step, end)) for pos in range(start, end, step)]
+
+
+def split_into_chunks(text, max_tokens, overlap_sentences=1):
+    """按句子边界将长文本切分为不超过 max_tokens 的片段，相邻片段重叠 overlap_sentences 句"""
+    spans = []
+    for span in split_sentences(text):
+        if estimate_tokens(text[span[0]:span[1]]) > max_tokens:
+            spans.extend(_split_long_span(text, span, max_tokens))
+        else:
+            spans.append(span)
+    if not spans:
+        return []
+
+    token_counts = [estimate_tokens(text[start:end]) for start, end in spans]
+    chunks = []
+    first = 0
+    while first < len(spans):
+        last = first
+        total = token_counts[first]
+        while last + 1 < len(spans) and total + token_counts[last + 1] <= max_tokens:
+            last += 1
+            total += token_counts[last]
+        chunks.append(text[spans[first][0]:spans[last][1]].strip())
+        if last + 1 >= len(spans):
+            break
+        # 下一片段从末尾回退 overlap_sentences 句开始，且至少前进一句
+        first = max(first + 1, last + 1 - overlap_sentences)
+    return chunks
@@ -0,0 +1,94 @@
+import os
+import re
+import sys
+import zlib
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.json_stream import iter_json_array
+
+# MinHash 参数：128 个哈希函数分为 16 个 band（每 band 8 行），
+# 估计 Jaccard 相似度约 0.7 以上的文章对大概率落入同一个桶
+NUM_PERM = 128
+NUM_BANDS = 16
+SHINGLE_SIZE = 5
+DEFAULT_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+class NearDuplicateIndex:
+    """基于 MinHash + LSH 分桶的在线近重复检测
+
+    按字符 shingle 计算签名，与语言无关。文章逐篇加入：与已有代表文章的估计 Jaccard
+    相似度达到 threshold 时视为其近重复，否则自身成为新的代表文章。只保存代表文章的签名。
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, num_bands=NUM_BANDS,
+                 shingle_size=SHINGLE_SIZE, seed=1):
+        if num_perm % num_bands:
+            raise ValueError("num_perm 必须能被 num_bands 整除")
+        self.threshold = threshold
+        self.num_bands = num_bands
+        self.rows = num_perm // num_bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.RandomState(seed)
+        # a、b 取 32 位以内，保证 a * x + b 在 uint64 内不溢出
+        self._a = rng.randint(1, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self._buckets = [{} for _ in range(num_bands)]
+        self._signatures = {}
+
+    def signature(self, text):
+        """计算文本的 MinHash 签名，文本过短时返回 None"""
+        text = _WHITESPACE_PATTERN.sub(" ", text).strip().lower()
+        if len(text) < self.shingle_size:
+            return None
+        shingles = {text[i:i + self.shingle_size] for i in range(len(text) - self.shingle_size + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        return ((self._a * hashes + self._b) % _MERSENNE_PRIME).min(axis=1)
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.num_bands)]
+
+    def add(self, doc_id, text):
+        """加入一篇文章；若为已有代表文章的近重复则返回该代表文章的 ID，否则返回 None"""
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        keys = self._band_keys(signature)
+
+        candidates = set()
+        for bucket, key in zip(self._buckets, keys):
+            candidates.update(bucket.get(key, ()))
+        best_id, best_similarity = None, self.threshold
+        for candidate in candidates:
+            similarity = float(np.mean(self._signatures[candidate] == signature))
+            if similarity >= best_similarity:
+                best_id, best_similarity = candidate, similarity
+        if best_id is not None:
+            return best_id
+
+        self._signatures[doc_id] = signature
+        for bucket, key in zip(self._buckets, keys):
+            bucket.setdefault(key, []).append(doc_id)
+        return None
+
+
+def find_near_duplicates(input_file, id_key, content_key="content", threshold=DEFAULT_THRESHOLD):
+    """流式扫描输入 JSON，返回 {近重复文章ID: 代表文章ID}"""
+    index = NearDuplicateIndex(threshold=threshold)
+    duplicate_of = {}
+    total = 0
+    for article in iter_json_array(input_file):
+        total += 1
+        representative = index.add(article[id_key], article.get(content_key) or "")
+        if representative is not None:
+            duplicate_of[article[id_key]] = representative
+    print(f"近重复检测：共 {total} 篇文章，{len(duplicate_of)} 篇为近重复，"
+          f"聚为 {len(set(duplicate_of.values()))} 个重复簇")
+    return duplicate_of
@@ -1,53 +1,48 @@
 import json
 import os
-import numpy as np
-from sklearn.neighbors import NearestNeighbors
-from sklearn.feature_extraction.text import TfidfVectorizer
-from openai import OpenAI
+import sys
+from openai import AsyncOpenAI
+from example_selector import ExampleSelector
+from dedup import find_near_duplicates
+from extraction_runner import result_fields, run_extraction
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.llm_cache import LLMCache
+from common.rate_limiter import AdaptiveRateLimiter
+from common.result_store import ResultStore
 
 EXAMPLE_LIB_PATH = '' 
+# 示例检索使用的分析器，见 example_selector.make_vectorizer
+EXAMPLE_ANALYZER = "char_hash"
+INPUT_FILE = 'D:/学术/datasets/thai/thai_data.json'
+OUTPUT_FILE = ''
 os.environ["OPENAI_API_KEY"] = ""
 # 设置 OPENAI_BASE_URL 环境变量
 os.environ["OPENAI_BASE_URL"] = ""
 
+# 并发请求数
+MAX_CONCURRENT_REQUESTS = 30
+# 超过该估算 token 数的文章按句子切分后分片抽取
+CHUNK_TOKEN_THRESHOLD = 3000
+# 短新闻打包：每个请求正文合计不超过该估算 token 数（None 表示关闭打包）；
+# 示例按文章检索，只有检索到相同示例的文章才会打包
+PACK_MAX_TOKENS = 2000
+
+# 近重复文章判定阈值（估计 Jaccard 相似度），近重复文章只抽取一次
+DEDUP_THRESHOLD = 0.8
+
+# LLM 响应缓存：输入完全相同的请求（temperature=0）直接复用结果
+llm_cache = LLMCache()
+# 自适应限速：遇到 429/5xx 时降速，成功时逐步提速
+rate_limiter = AdaptiveRateLimiter(initial_rate=10.0, max_rate=100.0, name="deepseek")
+
 # 初始化OpenAI客户端
-client = OpenAI(
+client = AsyncOpenAI(
     api_key=os.environ.get("OPENAI_API_KEY"),
     base_url=os.environ.get("OPENAI_BASE_URL"),
 )
 
 
-class ExampleSelector:
-    def __init__(self, example_path, k=3):
-        with open(example_path, 'r', encoding='utf-8') as f:
-            self.examples = json.load(f)
-
-        # 准备TF-IDF特征
-        self.vectorizer = TfidfVectorizer()
-        self.knn = NearestNeighbors(n_neighbors=k, metric='cosine')
-
-        # 提取文本内容并训练模型
-        self.example_texts = [ex['content'] for ex in self.examples]
-        self._train_model()
-
-    def _train_model(self):
-        X = self.vectorizer.fit_transform(self.example_texts)
-        self.knn.fit(X)
-
-    def get_similar_examples(self, query_text):
-        query_vec = self.vectorizer.transform([query_text])
-        distances, indices = self.knn.kneighbors(query_vec)
-
-        selected_examples = []
-        for idx in indices[0]:
-            example = self.examples[idx]
-            selected_examples.append({
-                "content": example['content'],
-                "answer": json.dumps(example['answer'], ensure_ascii=False)
-            })
-        return selected_examples
-
-
 def build_dynamic_prompt(examples):
     example_section = "\n\n## 参考示例："
     for i, ex in enumerate(examples, 1):
@@ -59,12 +54,16 @@ def build_dynamic_prompt(examples):
 
 
 # 初始化示例选择器
-example_selector = ExampleSelector(EXAMPLE_LIB_PATH, k=3)
+example_selector = ExampleSelector(EXAMPLE_LIB_PATH, k=3, analyzer=EXAMPLE_ANALYZER)
 
 # 主处理逻辑
-with open('D:/学术/datasets/thai/thai_data.json', 'r', encoding='utf-8') as file:
+with open(INPUT_FILE, 'r', encoding='utf-8') as file:
     json_data = json.load(file)
 
+# 结果日志：每篇文章处理完成后追加一行，启动时据此恢复进度
+result_store = ResultStore(OUTPUT_FILE, "article_id")
+result_store.restore(json_data)
+
 # 基础提示模板
 base_prompt = """
 Task: 你是产业领域的实体关系抽取专家，按照以下步骤来从文本中抽取出实体关系。
@@ -122,63 +121,58 @@ Step 4 - 输出格式校验
 
 """
 
+
 # 数据处理流程
-total_articles = len(json_data)
-processed_count = 0
+# 在调用 LLM 之前一次性为所有待处理文章检索示例
+pending_articles = [article for article in json_data if "entity_relationship" not in article]
+example_indices = dict(zip(
+    [article["article_id"] for article in pending_articles],
+    example_selector.select_indices_batch([article["content"] for article in pending_articles])
+))
 
-for i, article in enumerate(json_data):
-    if "entity_relationship" in article:
-        print(f"跳过文章 {article['article_id']}")
-        processed_count += 1
-        continue
 
+def build_messages(article):
+    """动态选择示例并构造请求消息"""
     content = article["content"]
-    article_id = article["article_id"]
-
-    # 动态选择示例
-    selected_examples = example_selector.get_similar_examples(content)
+    selected_examples = example_selector.examples_for(example_indices[article["article_id"]])
     dynamic_prompt = base_prompt + build_dynamic_prompt(selected_examples)
+    return [
+        {"role": "system", "content": dynamic_prompt},
+        {"role": "user", "content": f"请从以下文本中抽取实体关系：\n{content}"}
+    ]
+
+
+def save_result(article):
+    """将单篇文章的结果追加到结果日志"""
+    result_store.append(article["article_id"], result_fields(article))
+
+
+# 抽取前流式扫描输入文件，找出近重复文章
+duplicate_of = find_near_duplicates(INPUT_FILE, "article_id", threshold=DEDUP_THRESHOLD)
+
+run_extraction(
+    json_data,
+    on_result=save_result,
+    client=client,
+    build_messages=build_messages,
+    id_key="article_id",
+    model="deepseek-chat",
+    temperature=0,
+    max_concurrency=MAX_CONCURRENT_REQUESTS,
+    cache=llm_cache,
+    rate_limiter=rate_limiter,
+    duplicate_of=duplicate_of,
+    chunk_threshold=CHUNK_TOKEN_THRESHOLD,
+    pack_max_tokens=PACK_MAX_TOKENS,
+    error_result="ERROR",
+)
 
-    print(f"处理 {i + 1}/{total_articles}: {article_id}")
-
-    try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            temperature=0,
-            messages=[
-                {"role": "system", "content": dynamic_prompt},
-                {"role": "user", "content": f"请从以下文本中抽取实体关系：\n{content}"}
-            ],
-            stream=False
-        )
-
-        result = response.choices[0].message.content
-        article["entity_relationship"] = result
-
-        # 打印处理结果
-        print(f"内容: {content}")
-        print(f"结果: {result}")
-        print("-" * 50)
-
-        processed_count += 1
-
-    except Exception as e:
-        print(f"处理失败 {article_id}: {e}")
-        article["entity_relationship"] = "ERROR"
-
-    # 定期保存
-    if (i + 1) % 2 == 0:
-        print(f"保存进度 {i + 1}...")
-        try:
-            with open('', 'w', encoding='utf-8') as f:
-                json.dump(json_data, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            print(f"保存失败: {e}")
+llm_cache.report()
+rate_limiter.report()
 
 # 最终保存
 try:
-    with open('', 'w', encoding='utf-8') as f:
-        json.dump(json_data, f, ensure_ascii=False, indent=4)
-    print(f"处理完成，保存至 ")
+    result_store.compact(json_data, indent=4)
+    print(f"处理完成，保存至 {OUTPUT_FILE}")
 except Exception as e:
-    print(f"最终保存失败: {e}")
\ No newline at end of file
+    print(f"最终保存失败: {e}")
@@ -1,14 +1,45 @@
 import json
-from openai import OpenAI
+import os
+import sys
+from openai import AsyncOpenAI
+from dedup import find_near_duplicates
+from extraction_runner import result_fields, run_extraction
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.llm_cache import LLMCache
+from common.rate_limiter import AdaptiveRateLimiter
+from common.result_store import ResultStore
 
 
 # 初始化 OpenAI 客户端
-client = OpenAI(api_key="", base_url="")
+client = AsyncOpenAI(api_key="", base_url="")
+
+# 并发请求数
+MAX_CONCURRENT_REQUESTS = 30
+# 超过该估算 token 数的文章按句子切分后分片抽取
+CHUNK_TOKEN_THRESHOLD = 3000
+# 短新闻打包：每个请求正文合计不超过该估算 token 数（None 表示关闭打包）
+PACK_MAX_TOKENS = 2000
+
+# 近重复文章判定阈值（估计 Jaccard 相似度），近重复文章只抽取一次
+DEDUP_THRESHOLD = 0.8
+
+# LLM 响应缓存：输入完全相同的请求（temperature=0）直接复用结果
+llm_cache = LLMCache()
+# 自适应限速：遇到 429/5xx 时降速，成功时逐步提速
+rate_limiter = AdaptiveRateLimiter(initial_rate=10.0, max_rate=100.0, name="deepseek")
+
+input_file = ''
+output_file = ''
 
 # 读取 JSON 文件
-with open('', 'r', encoding='utf-8') as file:
+with open(input_file, 'r', encoding='utf-8') as file:
     json_data = json.load(file)
 
+# 结果日志：每篇文章处理完成后追加一行，启动时据此恢复进度
+result_store = ResultStore(output_file, "aid")
+result_store.restore(json_data)
+
 # 定义示例
 examples = """ 
     example content:阿里巴巴集团宣布，已收购银泰商业集团74%的股份，进一步加强其在零售业的布局。阿里巴巴集团CEO张勇表示，此次收购将有助于集团实现线上线下融合的战略目标。
@@ -44,42 +75,45 @@ taskprompt = f"""
     If there is no entity relationship, output [null].
     """
 
-# 遍历 JSON 数据中的每篇文章
-for article in json_data:
-    # 如果文章已经包含 'entity_relationship' 字段，跳过处理
-    if "entity_relationship" in article:
-        print(f"Skipping article {article['aid']}, already processed.")
-        continue
-    content = article["content"]  # 提取文章内容
-    aid = article["aid"]  # 提取文章 ID（可选）
-
-    print(f"Processing article: {aid}")
-
-    # 调用 Deepseek API 处理文章内容
-    response = client.chat.completions.create(
-        model="deepseek-chat",
-        temperature=0,
-        messages=[
-            {"role": "system", "content": taskprompt},
-            {"role": "user", "content": content},
-        ],
-        stream=False
-    )
-
-    # 提取 API 返回的结果
-    result = response.choices[0].message.content
-
-    # 将结果保存到 JSON 数据中（可选）
-    article["entity_relationship"] = result
-
-    # 打印结果
-    print(f"Article ID: {aid}")
-    print(f"Content: {content}")
-    print(f"Entity Relationship: {result}")
-    print("-" * 50)
-
-# 将更新后的 JSON 数据保存到文件（可选）
-with open('', 'w', encoding='utf-8') as file:
-    json.dump(json_data, file, ensure_ascii=False, indent=4)
-
-print("Processing complete. Results saved to ''.")
\ No newline at end of file
+
+def build_messages(article):
+    """构造单篇文章的请求消息"""
+    return [
+        {"role": "system", "content": taskprompt},
+        {"role": "user", "content": article["content"]},
+    ]
+
+
+def save_result(article):
+    """将单篇文章的结果追加到结果日志"""
+    result_store.append(article["aid"], result_fields(article))
+
+
+# 抽取前流式扫描输入文件，找出近重复文章
+duplicate_of = find_near_duplicates(input_file, "aid", threshold=DEDUP_THRESHOLD)
+
+# 并发调用 Deepseek API 处理所有文章；失败的文章不写入结果，重新运行时会再次处理
+run_extraction(
+    json_data,
+    on_result=save_result,
+    client=client,
+    build_messages=build_messages,
+    id_key="aid",
+    model="deepseek-chat",
+    temperature=0,
+    max_concurrency=MAX_CONCURRENT_REQUESTS,
+    cache=llm_cache,
+    rate_limiter=rate_limiter,
+    duplicate_of=duplicate_of,
+    chunk_threshold=CHUNK_TOKEN_THRESHOLD,
+    pack_max_tokens=PACK_MAX_TOKENS,
+    error_result=None,
+)
+
+llm_cache.report()
+rate_limiter.report()
+
+# 将更新后的 JSON 数据一次性写出到文件
+result_store.compact(json_data, indent=4)
+
+print(f"Processing complete. Results saved to '{output_file}'.")
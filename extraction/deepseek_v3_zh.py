@@ -1,9 +1,30 @@
 import json
 import os
-from openai import OpenAI
+import sys
+from openai import AsyncOpenAI
+from dedup import find_near_duplicates
+from extraction_runner import result_fields, run_extraction
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.llm_cache import LLMCache
+from common.rate_limiter import AdaptiveRateLimiter
+from common.result_store import ResultStore
 
 # 初始化 OpenAI 客户端
-client = OpenAI(api_key="", base_url="")
+client = AsyncOpenAI(api_key="", base_url="")
+
+# 并发请求数
+MAX_CONCURRENT_REQUESTS = 30
+# 超过该估算 token 数的文章按句子切分后分片抽取
+CHUNK_TOKEN_THRESHOLD = 3000
+
+# 近重复文章判定阈值（估计 Jaccard 相似度），近重复文章只抽取一次
+DEDUP_THRESHOLD = 0.8
+
+# LLM 响应缓存：输入完全相同的请求（temperature=0）直接复用结果
+llm_cache = LLMCache()
+# 自适应限速：遇到 429/5xx 时降速，成功时逐步提速
+rate_limiter = AdaptiveRateLimiter(initial_rate=10.0, max_rate=100.0, name="deepseek")
 
 # 读取 JSON 文件
 input_file = ''
@@ -16,6 +37,10 @@ except Exception as e:
     print(f"读取 JSON 文件时出错: {e}")  # 使用 print 输出错误信息
     raise
 
+# 结果日志：每篇文章处理完成后追加一行，启动时据此恢复进度
+result_store = ResultStore(output_file, "news_id")
+result_store.restore(json_data)
+
 # 定义示例
 examples = """ 
     example content:阿里巴巴集团宣布，已收购银泰商业集团74%的股份，进一步加强其在零售业的布局。阿里巴巴集团CEO张勇表示，此次收购将有助于集团实现线上线下融合的战略目标。
@@ -48,65 +73,46 @@ prompt = f"""
     Output strictly in accordance with the format and only the final result is required
     """
 
-# 初始化计数器，用于跟踪进度
-total_articles = len(json_data)  # 总文章数
-processed_count = 0  # 已处理文章数
-
-# 遍历 JSON 数据中的每篇文章
-for i, article in enumerate(json_data):
-    # 如果文章已经包含 'entity_relationship' 字段，跳过处理
-    if "entity_relationship" in article:
-        print(f"跳过文章 {article['news_id']}，已处理。")
-        processed_count += 1
-        continue
-
-    content = article["content"]  # 提取文章内容
-    news_id = article["news_id"]  # 提取文章 ID
-
-    print(f"正在处理文章 {i + 1}/{total_articles}: {news_id}")
-
-    try:
-        # 调用 Deepseek API 处理文章内容
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            temperature=0,
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": content},
-            ],
-            stream=False
-        )
-
-        # 提取 API 返回的结果
-        result = response.choices[0].message.content
-        article["entity_relationship"] = result  # 将结果保存到文章中
-
-        print(f"文章 ID: {news_id}")
-        print(f"内容: {content}")
-        print(f"实体关系: {result}")
-        print("-" * 50)
-
-        processed_count += 1
-
-    except Exception as e:
-        print(f"处理文章 {news_id} 时出错: {e}")  # 使用 print 输出错误信息
-        article["entity_relationship"] = "处理文章时出错"
-        processed_count += 1
-
-    # 每处理 100 条数据保存一次进度
-    if (i + 1) % 100 == 0:
-        print(f"已处理 {i + 1} 篇文章。正在保存进度...")
-        try:
-            with open(output_file, 'w', encoding='utf-8') as file:
-                json.dump(json_data, file, ensure_ascii=False, indent=4)
-            print(f"进度已保存到 '{output_file}'。")
-        except Exception as e:
-            print(f"保存进度到文件时出错: {e}")  # 使用 print 输出错误信息
-
-# 处理完所有数据后，最终保存一次
+
+def build_messages(article):
+    """构造单篇文章的请求消息"""
+    return [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": article["content"]},
+    ]
+
+
+def save_result(article):
+    """将单篇文章的结果追加到结果日志"""
+    result_store.append(article["news_id"], result_fields(article))
+
+
+# 抽取前流式扫描输入文件，找出近重复文章
+duplicate_of = find_near_duplicates(input_file, "news_id", threshold=DEDUP_THRESHOLD)
+
+# 并发调用 Deepseek API 处理所有文章
+run_extraction(
+    json_data,
+    on_result=save_result,
+    client=client,
+    build_messages=build_messages,
+    id_key="news_id",
+    model="deepseek-chat",
+    temperature=0,
+    max_concurrency=MAX_CONCURRENT_REQUESTS,
+    cache=llm_cache,
+    rate_limiter=rate_limiter,
+    duplicate_of=duplicate_of,
+    chunk_threshold=CHUNK_TOKEN_THRESHOLD,
+    error_result="处理文章时出错",
+)
+
+llm_cache.report()
+rate_limiter.report()
+
+# 处理完所有数据后，一次性写出最终结果
 try:
-    with open(output_file, 'w', encoding='utf-8') as file:
-        json.dump(json_data, file, ensure_ascii=False, indent=4)
+    result_store.compact(json_data, indent=4)
     print(f"处理完成。所有结果已保存到 '{output_file}'。")
 except Exception as e:
-    print(f"保存最终结果到文件时出错: {e}")  # 使用 print 输出错误信息
\ No newline at end of file
+    print(f"保存最终结果到文件时出错: {e}")  # 使用 print 输出错误信息
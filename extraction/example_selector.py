@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
+from sklearn.pipeline import make_pipeline
+
+# 索引文件格式版本，结构变化时递增以使旧索引失效
+INDEX_VERSION = 2
+
+# 哈希特征维度，字符 n-gram 特征被映射到固定宽度空间，内存与示例库大小无关
+HASH_N_FEATURES = 2 ** 20
+
+
+def make_vectorizer(analyzer):
+    """根据分析器名称构建向量器
+
+    word:      sklearn 默认按词切分的 TF-IDF（泰语、中文整句会被当成一个词）
+    char_hash: 字符 2~4-gram + 固定宽度哈希 + TF-IDF，适用于 zh/th/vi 等无空格或音节语言
+    """
+    if analyzer == "word":
+        return TfidfVectorizer()
+    if analyzer == "char_hash":
+        return make_pipeline(
+            HashingVectorizer(analyzer="char", ngram_range=(2, 4), n_features=HASH_N_FEATURES,
+                              alternate_sign=False, norm=None),
+            TfidfTransformer(norm="l2", sublinear_tf=True),
+        )
+    raise ValueError(f"未知的分析器: {analyzer}")
+
+
+class ExampleSelector:
+    """基于 TF-IDF 余弦相似度的少样本示例选择器
+
+    拟合好的向量器和示例矩阵持久化到 index_path，示例文件内容（哈希）不变时直接加载，
+    不再重复训练。TF-IDF 行向量已做 L2 归一化，点积即余弦相似度，因此批量检索只需
+    一次稀疏矩阵乘法。analyzer 见 make_vectorizer。
+    """
+
+    def __init__(self, example_path, k=3, index_path=None, analyzer="word"):
+        with open(example_path, 'rb') as f:
+            raw = f.read()
+        self.examples = json.loads(raw.decode('utf-8'))
+        self.example_texts = [ex['content'] for ex in self.examples]
+        self.k = min(k, len(self.examples))
+        self.example_hash = hashlib.sha256(raw).hexdigest()
+        self.analyzer = analyzer
+        self.index_path = index_path or f"{example_path}.{analyzer}.index.pkl"
+
+        if not self._load_index():
+            self._train_model()
+            self._save_index()
+
+    def _train_model(self):
+        self.vectorizer = make_vectorizer(self.analyzer)
+        self.example_matrix = self.vectorizer.fit_transform(self.example_texts).tocsr()
+
+    def _index_signature(self):
+        return {"version": INDEX_VERSION, "example_hash": self.example_hash, "analyzer": self.analyzer}
+
+    def _load_index(self):
+        """加载持久化索引，示例文件已变化或索引损坏时返回 False"""
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            with open(self.index_path, 'rb') as f:
+                index = pickle.load(f)
+        except Exception as e:
+            print(f"示例索引加载失败，重新训练: {e}")
+            return False
+        if index.get("signature") != self._index_signature():
+            print("示例库已变化，重新训练示例索引")
+            return False
+        self.vectorizer = index["vectorizer"]
+        self.example_matrix = index["example_matrix"]
+        print(f"已加载示例索引: {self.index_path}")
+        return True
+
+    def _save_index(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({
+                "signature": self._index_signature(),
+                "vectorizer": self.vectorizer,
+                "example_matrix": self.example_matrix,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.index_path)
+
+    def select_indices_batch(self, query_texts, batch_size=1024):
+        """批量检索每条查询最相似的 k 个示例，返回形如 (len(query_texts), k) 的下标矩阵"""
+        if not query_texts or self.k == 0:
+            return np.zeros((len(query_texts), self.k), dtype=np.int64)
+
+        example_matrix_t = self.example_matrix.T.tocsc()
+        results = []
+        # 分块计算，避免 查询数 × 示例数 的稠密相似度矩阵占用过多内存
+        for start in range(0, len(query_texts), batch_size):
+            query_matrix = self.vectorizer.transform(query_texts[start:start + batch_size])
+            sims = (query_matrix @ example_matrix_t).toarray()
+            top = np.argpartition(-sims, self.k - 1, axis=1)[:, :self.k]
+            top_sims = np.take_along_axis(sims, top, axis=1)
+            order = np.argsort(-top_sims, axis=1, kind='stable')
+            results.append(np.take_along_axis(top, order, axis=1))
+        return np.vstack(results)
+
+    def examples_for(self, indices):
+        """将示例下标转换为提示词所需的示例列表"""
+        selected_examples = []
+        for idx in indices:
+            example = self.examples[idx]
+            selected_examples.append({
+                "content": example['content'],
+                "answer": json.dumps(example['answer'], ensure_ascii=False)
+            })
+        return selected_examples
+
+    def get_similar_examples(self, query_text):
+        return self.examples_for(self.select_indices_batch([query_text])[0])
@@ -0,0 +1,280 @@
+import asyncio
+import json
+import os
+import sys
+
+from chunking import estimate_tokens, split_into_chunks
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.extraction_result import empty_result, merge_extractions, parse_extraction
+from common.rate_limiter import acall_with_rate_limit
+
+# 默认并发请求数
+MAX_CONCURRENT_REQUESTS = 30
+
+# 打包模式下追加到系统提示词后的说明
+PACK_INSTRUCTION = """
+The user message contains several articles, each starting with a line "[ID: <id>]".
+Extract entities and relationships from each article independently, using the output format above for each article.
+Return only a JSON object whose keys are the article IDs and whose values are the extraction results
+of the corresponding article, e.g. {"<id1>": <result of article 1>, "<id2>": <result of article 2>}.
+"""
+
+
+# 抽取阶段写入文章并需要持久化的字段
+RESULT_FIELDS = ("entity_relationship", "entity_relationship_raw", "duplicate_of")
+
+
+def result_fields(article):
+    """取出文章中需要写入结果日志的字段"""
+    return {field: article[field] for field in RESULT_FIELDS if field in article}
+
+
+def parse_packed_response(text):
+    """解析打包请求的响应，返回 {文章ID: 该文章的原始抽取结果}，无法解析时返回空字典"""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {str(article_id): value for article_id, value in data.items()}
+
+
+class ExtractionRunner:
+    """基于 asyncio 的并发实体关系抽取执行器
+
+    build_messages(article) 返回该文章的 messages 列表；已包含 entity_relationship
+    字段的文章直接跳过（断点续跑）。模型输出在抽取时即解析为
+    {"entities": {类型: [...]}, "triplet": ["(a, rel, b)"]} 写入 entity_relationship；无法解析的输出
+    写入空结果，原文保存在 entity_relationship_raw 中。error_result 为 None 时，失败的文章不写入结果，
+    下次运行会重新抽取。传入 cache（common.llm_cache.LLMCache）时，输入完全相同的请求
+    直接复用缓存结果。
+
+    设置 chunk_threshold 后，估算 token 数超过该值的文章按句子切分为重叠
+    chunk_overlap 句的片段并发抽取，合并去重后写入结果。
+
+    设置 pack_max_tokens 后，估算 token 数不超过 pack_item_max_tokens 的短文章按输入顺序
+    打包，每包最多 pack_max_articles 篇、正文合计不超过 pack_max_tokens，共用一次请求，
+    要求模型返回以文章 ID 为键的 JSON，再拆回各篇文章。只有系统提示词相同的文章才会打包在一起，
+    按文章检索示例（提示词各不相同）时不会用别的文章的示例抽取。
+    响应中缺失的文章回退为单篇抽取。
+
+    传入 rate_limiter（common.rate_limiter.AdaptiveRateLimiter）时，请求按其自适应速率发出，
+    max_concurrency 仅作为同时在途请求数的上限。
+
+    传入 duplicate_of（{近重复文章ID: 代表文章ID}，见 dedup.find_near_duplicates）时，
+    近重复文章不再请求模型，而是复制代表文章的结果并记录 duplicate_of 来源。
+    """
+
+    def __init__(self, client, build_messages, id_key, model="deepseek-chat", temperature=0,
+                 max_concurrency=MAX_CONCURRENT_REQUESTS, error_result="ERROR", cache=None,
+                 chunk_threshold=None, chunk_overlap=1,
+                 pack_max_tokens=None, pack_item_max_tokens=300, pack_max_articles=8,
+                 rate_limiter=None, duplicate_of=None):
+        self.client = client
+        self.build_messages = build_messages
+        self.id_key = id_key
+        self.model = model
+        self.temperature = temperature
+        self.max_concurrency = max_concurrency
+        self.error_result = error_result
+        self.cache = cache
+        self.chunk_threshold = chunk_threshold
+        self.chunk_overlap = chunk_overlap
+        self.pack_max_tokens = pack_max_tokens
+        self.pack_item_max_tokens = pack_item_max_tokens
+        self.pack_max_articles = pack_max_articles
+        self.rate_limiter = rate_limiter
+        self.duplicate_of = duplicate_of or {}
+
+    async def _request(self, messages, semaphore):
+        """在并发上限内发起一次 chat completion 请求"""
+        params = dict(model=self.model, temperature=self.temperature, messages=messages, stream=False)
+        key = None
+        if self.cache is not None:
+            # 命中缓存时不占用并发名额
+            key = self.cache.make_key(sample=None, **params)
+            content = self.cache.get(key)
+            if content is not None:
+                return content
+        async with semaphore:
+            if self.rate_limiter is not None:
+                response = await acall_with_rate_limit(self.rate_limiter, self.client.chat.completions.create, **params)
+            else:
+                response = await self.client.chat.completions.create(**params)
+        content = response.choices[0].message.content
+        if key is not None:
+            self.cache.put(key, content)
+        return content
+
+    async def _extract_chunked(self, article, chunks, semaphore):
+        """并发抽取长文章的各个片段并合并结果"""
+        responses = await asyncio.gather(*(
+            self._request(self.build_messages({**article, "content": chunk}), semaphore)
+            for chunk in chunks
+        ))
+        parsed = [parse_extraction(response) for response in responses]
+        failed = sum(result is None for result in parsed)
+        if failed:
+            print(f"文章 {article[self.id_key]} 有 {failed}/{len(chunks)} 个片段结果无法解析")
+        return merge_extractions([result for result in parsed if result is not None])
+
+    async def _extract_article(self, article, semaphore):
+        """抽取单篇文章，失败时返回 error_result"""
+        try:
+            content = article["content"]
+            if self.chunk_threshold and estimate_tokens(content) > self.chunk_threshold:
+                chunks = split_into_chunks(content, self.chunk_threshold, self.chunk_overlap)
+                if len(chunks) > 1:
+                    print(f"文章 {article[self.id_key]} 过长，切分为 {len(chunks)} 个片段")
+                    return await self._extract_chunked(article, chunks, semaphore)
+            return await self._request(self.build_messages(article), semaphore)
+        except Exception as e:
+            print(f"处理失败 {article[self.id_key]}: {e}")
+            return self.error_result
+
+    def _plan_packs(self, articles):
+        """将系统提示词相同的短文章按输入顺序分组，返回 (打包列表, 单篇列表)"""
+        packs, singles = [], []
+        # 系统提示词 -> (当前包, 当前包的 token 数)
+        open_packs = {}
+        for article in articles:
+            tokens = estimate_tokens(article["content"])
+            if tokens > self.pack_item_max_tokens:
+                singles.append(article)
+                continue
+            prompt = self.build_messages(article)[0]["content"]
+            current, current_tokens = open_packs.get(prompt, ([], 0))
+            if current and (len(current) >= self.pack_max_articles
+                            or current_tokens + tokens > self.pack_max_tokens):
+                packs.append(current)
+                current, current_tokens = [], 0
+            open_packs[prompt] = (current + [article], current_tokens + tokens)
+        packs.extend(current for current, _ in open_packs.values())
+        # 只有一篇的包没有意义，按单篇处理
+        singles.extend(pack[0] for pack in packs if len(pack) == 1)
+        return [pack for pack in packs if len(pack) > 1], singles
+
+    async def _extract_pack(self, pack, semaphore):
+        """一次请求抽取一组系统提示词相同的短文章，返回 {文章ID: 结果}"""
+        system_prompt = self.build_messages(pack[0])[0]["content"] + PACK_INSTRUCTION
+        user_content = "\n\n".join(f"[ID: {article[self.id_key]}]\n{article['content']}" for article in pack)
+        try:
+            response = await self._request([
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content},
+            ], semaphore)
+        except Exception as e:
+            print(f"打包请求失败（{len(pack)} 篇）: {e}")
+            return {}
+        return parse_packed_response(response)
+
+    async def run(self, articles, on_result=None):
+        """并发抽取所有未处理的文章，按输入顺序返回 (article, result) 列表
+
+        每篇文章完成时立即写入解析后的 article["entity_relationship"]，并调用 on_result(article)。
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        pending = []
+        for article in articles:
+            if "entity_relationship" in article:
+                print(f"跳过文章 {article[self.id_key]}，已处理。")
+                continue
+            pending.append(article)
+
+        # 代表文章也在本批数据中的近重复文章，等代表文章抽取完成后复制其结果
+        by_id = {article[self.id_key]: article for article in articles}
+        duplicates = [article for article in pending
+                      if by_id.get(self.duplicate_of.get(article[self.id_key])) is not None]
+        if duplicates:
+            duplicate_set = set(map(id, duplicates))
+            pending_unique = [article for article in pending if id(article) not in duplicate_set]
+        else:
+            pending_unique = pending
+
+        total = len(pending)
+        print(f"共 {len(articles)} 篇文章，待处理 {total} 篇（其中近重复 {len(duplicates)} 篇），"
+              f"并发数 {self.max_concurrency}")
+        done_count = 0
+        unparsed_count = 0
+        results = {}
+
+        def finish(article, result):
+            nonlocal done_count, unparsed_count
+            if result is not None and result != self.error_result:
+                parsed = parse_extraction(result)
+                if parsed is None:
+                    unparsed_count += 1
+                    article["entity_relationship_raw"] = result
+                    parsed = empty_result()
+                result = parsed
+            if result is not None:
+                article["entity_relationship"] = result
+            results[id(article)] = result
+            done_count += 1
+            print(f"已完成 {done_count}/{total}: {article[self.id_key]}")
+            print(f"实体关系: {result}")
+            print("-" * 50)
+            if on_result is not None and result is not None:
+                on_result(article)
+
+        async def worker(article):
+            finish(article, await self._extract_article(article, semaphore))
+
+        fallback_count = 0
+
+        async def pack_worker(pack):
+            nonlocal fallback_count
+            packed = await self._extract_pack(pack, semaphore)
+            leftovers = []
+            for article in pack:
+                result = packed.get(str(article[self.id_key]))
+                if result is None:
+                    leftovers.append(article)
+                else:
+                    finish(article, result)
+            if leftovers:
+                fallback_count += len(leftovers)
+                await asyncio.gather(*(worker(article) for article in leftovers))
+
+        if self.pack_max_tokens:
+            packs, singles = self._plan_packs(pending_unique)
+            print(f"打包模式：{sum(len(pack) for pack in packs)} 篇短文章打包为 {len(packs)} 个请求")
+        else:
+            packs, singles = [], pending_unique
+
+        await asyncio.gather(*(worker(article) for article in singles),
+                             *(pack_worker(pack) for pack in packs))
+        if packs:
+            print(f"打包请求 {len(packs)} 次，其中 {fallback_count} 篇文章回退为单篇抽取")
+
+        copied = 0
+        for article in duplicates:
+            representative_id = self.duplicate_of[article[self.id_key]]
+            result = by_id[representative_id].get("entity_relationship")
+            if result is None or result == self.error_result:
+                # 代表文章抽取失败时近重复文章同样按失败处理
+                finish(article, self.error_result)
+                continue
+            article["duplicate_of"] = representative_id
+            finish(article, result)
+            copied += 1
+        if duplicates:
+            print(f"近重复去重：{copied} 篇文章复用代表文章的结果，节省 {copied} 次 LLM 调用")
+
+        if unparsed_count:
+            print(f"{unparsed_count} 篇文章的模型输出无法解析，原文已保存到 entity_relationship_raw")
+
+        # 按输入顺序返回结果
+        return [(article, results.get(id(article))) for article in pending]
+
+
+def run_extraction(articles, on_result=None, **kwargs):
+    """同步入口：创建 ExtractionRunner 并运行"""
+    runner = ExtractionRunner(**kwargs)
+    return asyncio.run(runner.run(articles, on_result=on_result))
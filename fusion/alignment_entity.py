@@ -1,14 +1,24 @@
 import json
 import os
+import sys
 import time
 
 import requests
 from typing import Dict, List, Any
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.llm_cache import LLMCache
+from common.rate_limiter import AdaptiveRateLimiter, call_with_rate_limit
+
 DEEPSEEK_URL = ""
 API_KEY = ""
 HEADERS = {"Authorization": f"Bearer {API_KEY}", "Content-Type": "application/json"}
 
+# LLM 响应缓存
+llm_cache = LLMCache()
+# 自适应限速：遇到 429/5xx 时降速，成功时逐步提速
+rate_limiter = AdaptiveRateLimiter(initial_rate=5.0, max_rate=50.0, name="deepseek")
+
 LANG_MAP = {
     "vi": "越南语",
     "th": "泰语",
@@ -36,24 +46,36 @@ def build_prompt(source_entity: str, entity_type: str, candidates: List[Dict], t
 请验证并输出确认为同一实体的匹配对："""
 
 
+def post_with_status(url: str, payload: Dict) -> requests.Response:
+    """发送请求，429/5xx 时抛出 HTTPError 以便限速器退避重试"""
+    response = requests.post(url, headers=HEADERS, json=payload, timeout=30)
+    if response.status_code == 429 or response.status_code >= 500:
+        response.raise_for_status()
+    return response
+
+
 def call_deepseek(prompt: str) -> List[List[str]]:
+    payload = {
+        "model": "deepseek-chat",
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.1
+    }
     try:
-        response = requests.post(
-            DEEPSEEK_URL,
-            headers=HEADERS,
-            json={
-                "model": "deepseek-chat",
-                "messages": [
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.1
-            },
-            timeout=30
-        )
-        if response.status_code == 200:
-            result = json.loads(response.json()["choices"][0]["message"]["content"])
-            return result.get("matches", [])
+        cache_key = llm_cache.make_key(**payload)
+        content = llm_cache.get(cache_key)
+        if content is None:
+            response = call_with_rate_limit(rate_limiter, post_with_status, DEEPSEEK_URL, payload)
+            if response.status_code != 200:
+                return []
+            content = response.json()["choices"][0]["message"]["content"]
+            result = json.loads(content)
+            llm_cache.put(cache_key, content)
+        else:
+            result = json.loads(content)
+        return result.get("matches", [])
     except Exception as e:
         print(f"API调用失败: {str(e)}")
     return []
@@ -68,6 +90,7 @@ def process_entities(input_file: str, output_file: str, batch_size: int = 100):
     start_time = time.time()  # 记录开始时间
     total_entities = len(data)
     processed_pairs = 0  # 新增处理计数器
+    auto_accepted = 0  # similarity.py 剪枝时标记的确定匹配，直接接受不调用 LLM
 
     print(f"🟢 开始处理，共 {total_entities} 个实体需要处理")
 
@@ -84,6 +107,14 @@ def process_entities(input_file: str, output_file: str, batch_size: int = 100):
             candidates = entity_info["matches"][lang_pair]
             processed_pairs += 1  # 更新计数器
 
+            certain = entity_info.get("certain", {}).get(lang_pair)
+            if certain:
+                print(f"   🌐 处理语言对 ({lang_idx + 1}/{len(lang_pairs)}) {lang_pair}")
+                print(f"      ✅ 确定匹配，直接接受: {certain}")
+                results.append([source_entity, "equal", certain])
+                auto_accepted += 1
+                continue
+
             # 新增候选数量显示
             print(f"   🌐 处理语言对 ({lang_idx + 1}/{len(lang_pairs)}) {lang_pair}")
             print(f"      📋 候选数量: {len(candidates)} | 已用时间: {time.time() - start_time:.1f}s")
@@ -121,10 +152,13 @@ def process_entities(input_file: str, output_file: str, batch_size: int = 100):
     print("\n🎉 处理完成！最终统计:")
     print(f"  总计处理实体: {total_entities} 个")
     print(f"  处理语言对: {processed_pairs} 对")
+    print(f"  确定匹配直接接受: {auto_accepted} 对")
     print(f"  发现匹配项: {len(results)} 条")
     print(f"  生成批次文件: {batch_count + 1 if results else batch_count} 个")
     print(f"  总耗时: {total_time / 60:.1f} 分钟")
     print(f"  平均速度: {processed_pairs / total_time:.1f} 对/秒")
+    llm_cache.report()
+    rate_limiter.report()
 
 
 def save_batch(output_file: str, results: List, batch_num: int):
@@ -0,0 +1,204 @@
+import json
+import os
+import zlib
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # 可选依赖，未安装时只能使用 IVF
+    hnswlib = None
+
+INDEX_VERSION = 2
+META_FILE = "meta.json"
+# IVF 训练 k-means 时的最大采样数与迭代次数
+KMEANS_MAX_SAMPLES = 100000
+KMEANS_ITERATIONS = 10
+# 计算向量归属簇与校验值时每块的行数
+ASSIGN_BLOCK_ROWS = 8192
+
+
+def matrix_checksum(matrix):
+    """对全部向量分块计算校验值，用于判断持久化的索引是否与当前向量一致（行数相同但内容或顺序不同也能发现）"""
+    crc = 0
+    for start in range(0, matrix.shape[0], ASSIGN_BLOCK_ROWS):
+        crc = zlib.crc32(np.ascontiguousarray(matrix[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32), crc)
+    return f"{matrix.shape[0]}x{matrix.shape[1]}:{crc:08x}"
+
+
+def names_checksum(names):
+    """实体名列表的校验值：索引返回的行号要映射回同样的实体名"""
+    crc = 0
+    for name in names:
+        crc = zlib.crc32(name.encode("utf-8") + b"\n", crc)
+    return f"{len(names)}:{crc:08x}"
+
+
+def _sorted_topk(indices, sims):
+    order = np.argsort(-sims, axis=1)
+    return np.take_along_axis(indices, order, axis=1), np.take_along_axis(sims, order, axis=1)
+
+
+class IVFIndex:
+    """倒排文件（IVF）近似检索：球面 k-means 把归一化向量分到 nlist 个簇，查询时只扫描最近的 nprobe 个簇
+
+    纯 numpy 实现。同一簇的向量按簇连续存放，查询按簇分组，每簇一次矩阵乘法。
+    """
+
+    def __init__(self, centroids, vectors, ids, offsets, nprobe):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, matrix, nlist=None, nprobe=16, seed=0):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        n = matrix.shape[0]
+        nlist = min(n, nlist or max(1, int(4 * np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+
+        sample = matrix[rng.choice(n, min(n, KMEANS_MAX_SAMPLES), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # 空簇保留原中心
+            filled = norms[:, 0] > 0
+            centroids[filled] = sums[filled] / norms[filled]
+
+        assign = np.concatenate([
+            np.argmax(matrix[start:start + ASSIGN_BLOCK_ROWS] @ centroids.T, axis=1)
+            for start in range(0, n, ASSIGN_BLOCK_ROWS)
+        ])
+        ids = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+        return cls(centroids, matrix[ids], ids, offsets, min(nprobe, nlist))
+
+    def search(self, queries, k):
+        """返回 (Top-k 下标, Top-k 相似度)，按相似度降序；候选不足 k 个时以 -1 / -inf 补齐"""
+        queries = np.asarray(queries, dtype=np.float32)
+        num_queries, nlist = queries.shape[0], self.centroids.shape[0]
+        best_ids = np.full((num_queries, k), -1, dtype=np.int64)
+        best_sims = np.full((num_queries, k), -np.inf, dtype=np.float32)
+
+        centroid_sims = queries @ self.centroids.T
+        if self.nprobe < nlist:
+            probes = np.argpartition(-centroid_sims, self.nprobe - 1, axis=1)[:, :self.nprobe]
+        else:
+            probes = np.broadcast_to(np.arange(nlist), (num_queries, nlist))
+
+        # 按簇分组查询：同一簇内的查询一次矩阵乘法
+        lists = probes.ravel()
+        rows = np.repeat(np.arange(num_queries), probes.shape[1])
+        order = np.argsort(lists, kind="stable")
+        lists, rows = lists[order], rows[order]
+        bounds = np.flatnonzero(np.diff(lists)) + 1
+        for segment_rows, list_id in zip(np.split(rows, bounds), lists[np.concatenate([[0], bounds])]):
+            start, end = self.offsets[list_id], self.offsets[list_id + 1]
+            if start == end:
+                continue
+            sims = queries[segment_rows] @ self.vectors[start:end].T
+            kk = min(k, end - start)
+            if kk < end - start:
+                top = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+            else:
+                top = np.broadcast_to(np.arange(end - start), sims.shape)
+            candidate_sims = np.concatenate([best_sims[segment_rows], np.take_along_axis(sims, top, axis=1)], axis=1)
+            candidate_ids = np.concatenate([best_ids[segment_rows], self.ids[start + top]], axis=1)
+            keep = np.argpartition(-candidate_sims, k - 1, axis=1)[:, :k]
+            best_sims[segment_rows] = np.take_along_axis(candidate_sims, keep, axis=1)
+            best_ids[segment_rows] = np.take_along_axis(candidate_ids, keep, axis=1)
+        return _sorted_topk(best_ids, best_sims)
+
+    def save(self, directory):
+        for name in ("centroids", "vectors", "ids", "offsets"):
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory, nprobe=16):
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                  for name in ("centroids", "vectors", "ids", "offsets")}
+        return cls(nprobe=min(nprobe, arrays["centroids"].shape[0]), **arrays)
+
+
+class HNSWIndex:
+    """基于 hnswlib 的 HNSW 近似检索（内积空间，向量需已归一化）"""
+
+    def __init__(self, index, ef):
+        self.index = index
+        self.index.set_ef(ef)
+
+    @classmethod
+    def build(cls, matrix, m=32, ef_construction=200, ef=128, seed=0):
+        if hnswlib is None:
+            raise ImportError("使用 HNSW 索引需要安装 hnswlib")
+        matrix = np.asarray(matrix, dtype=np.float32)
+        index = hnswlib.Index(space="ip", dim=matrix.shape[1])
+        index.init_index(max_elements=matrix.shape[0], ef_construction=ef_construction, M=m, random_seed=seed)
+        index.add_items(matrix, np.arange(matrix.shape[0]))
+        return cls(index, ef)
+
+    def search(self, queries, k):
+        k = min(k, self.index.get_current_count())
+        self.index.set_ef(max(self.index.ef, k))
+        labels, distances = self.index.knn_query(np.asarray(queries, dtype=np.float32), k=k)
+        # 内积空间的距离为 1 - 内积
+        return _sorted_topk(labels.astype(np.int64), (1.0 - distances).astype(np.float32))
+
+    def save(self, directory):
+        self.index.save_index(os.path.join(directory, "hnsw.bin"))
+
+    @classmethod
+    def load(cls, directory, dim, ef=128):
+        if hnswlib is None:
+            raise ImportError("使用 HNSW 索引需要安装 hnswlib")
+        index = hnswlib.Index(space="ip", dim=dim)
+        index.load_index(os.path.join(directory, "hnsw.bin"))
+        return cls(index, ef)
+
+
+BACKENDS = ("ivf", "hnsw")
+
+
+def load_index(directory, nprobe=16, ef=128):
+    """直接加载 directory 中的索引，不检查是否过期（用于并行子进程加载主进程刚检查或构建过的索引）"""
+    with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["backend"] == "ivf":
+        return IVFIndex.load(directory, nprobe=nprobe)
+    return HNSWIndex.load(directory, meta["dim"], ef=ef)
+
+
+def load_or_build_index(matrix, directory, backend="ivf", names=None, nlist=None, nprobe=16, m=32,
+                        ef_construction=200, ef=128):
+    """加载 directory 中与 matrix（及其实体名 names）一致的索引，不存在或已过期时重新构建并保存
+
+    nlist / nprobe 为 IVF 参数，m / ef_construction / ef 为 HNSW 参数；nprobe、ef 只影响查询，
+    修改它们不需要重建索引。
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的 ANN 后端: {backend}")
+    build_params = {"nlist": nlist} if backend == "ivf" else {"m": m, "ef_construction": ef_construction}
+    signature = {"version": INDEX_VERSION, "backend": backend, "dim": int(matrix.shape[1]),
+                 "checksum": matrix_checksum(matrix),
+                 "names": names_checksum(names) if names is not None else None, "params": build_params}
+
+    meta_path = os.path.join(directory, META_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            if json.load(f) == signature:
+                return load_index(directory, nprobe=nprobe, ef=ef)
+
+    if backend == "ivf":
+        index = IVFIndex.build(matrix, nlist=nlist, nprobe=nprobe)
+    else:
+        index = HNSWIndex.build(matrix, m=m, ef_construction=ef_construction, ef=ef)
+    os.makedirs(directory, exist_ok=True)
+    index.save(directory)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(signature, f, ensure_ascii=False, indent=2)
+    return index
@@ -0,0 +1,55 @@
+import numpy as np
+
+# 候选剪枝模式：mutual 只保留互为 Top-k 近邻的候选；csls 按 CSLS 分数重排并保留与最优候选差距不超过 margin 的候选
+PRUNE_MODES = ("mutual", "csls")
+
+
+def _gap(top_sims):
+    """每行第一名与第二名的相似度差；只有一个候选时视为无穷大"""
+    if top_sims.shape[1] < 2:
+        return np.full(top_sims.shape[0], np.inf, dtype=np.float32)
+    return top_sims[:, 0] - np.where(np.isfinite(top_sims[:, 1]), top_sims[:, 1], -np.inf)
+
+
+def neighborhood_mean(top_sims):
+    """Top-k 近邻的平均相似度（CSLS 中的 r），忽略 ANN 结果中补齐用的 -inf"""
+    finite = np.isfinite(top_sims)
+    counts = np.maximum(finite.sum(axis=1), 1)
+    return np.where(finite, top_sims, 0).sum(axis=1) / counts
+
+
+def prune_candidates(offset, top_indices, top_sims, rev_indices, rev_sims, threshold, mode="csls",
+                     csls_margin=0.1, certain_similarity=0.9, certain_margin=0.05):
+    """对一块源实体（行号从 offset 开始）的正向 Top-k 候选做剪枝
+
+    rev_indices / rev_sims 为目标 → 源方向全部目标实体的 Top-k 检索结果。
+    返回 (候选下标, 相似度, CSLS 分数, 保留掩码, 近乎确定的一对一匹配)，前四项为按输出顺序排好的二维数组
+    （mutual 模式不计算 CSLS 分数，为 None），最后一项为每个源实体确定匹配的目标下标，没有时为 -1。
+    确定匹配要求双方互为第一近邻、
+    相似度不低于 certain_similarity，且在两个方向上都领先第二名至少 certain_margin。
+    """
+    if mode not in PRUNE_MODES:
+        raise ValueError(f"未知的剪枝模式: {mode}")
+    rows = np.arange(offset, offset + top_indices.shape[0])
+    valid = (top_indices >= 0) & (top_sims >= threshold)
+    safe_indices = np.where(top_indices >= 0, top_indices, 0)
+
+    best = safe_indices[:, 0]
+    certain = ((rev_indices[best, 0] == rows) & valid[:, 0] & (top_sims[:, 0] >= certain_similarity)
+               & (_gap(top_sims) >= certain_margin) & (_gap(rev_sims)[best] >= certain_margin))
+    certain = np.where(certain, best, -1)
+
+    if mode == "mutual":
+        keep = valid & (rev_indices[safe_indices] == rows[:, None, None]).any(axis=2)
+        return top_indices, top_sims, None, keep, certain
+
+    # CSLS(x, y) = 2cos(x, y) - r_src(x) - r_tgt(y)，惩罚处于密集区域、与很多实体都相似的"枢纽"目标
+    scores = 2 * top_sims - neighborhood_mean(top_sims)[:, None] - neighborhood_mean(rev_sims)[safe_indices]
+    scores = np.where(valid, scores, -np.inf)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    scores = np.take_along_axis(scores, order, axis=1)
+    top_indices = np.take_along_axis(top_indices, order, axis=1)
+    # 确定匹配总是保留在候选中
+    is_certain = (top_indices == certain[:, None]) & (certain[:, None] >= 0)
+    keep = (np.isfinite(scores) & (scores >= scores[:, :1] - csls_margin)) | is_certain
+    return top_indices, np.take_along_axis(top_sims, order, axis=1), scores, keep, certain
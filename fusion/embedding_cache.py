@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+# 默认缓存位置：仓库根目录下的 .cache/
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "embedding_cache.sqlite"
+)
+# 单条 SQL 中 IN (...) 的参数个数上限
+_QUERY_CHUNK = 500
+
+
+class EmbeddingCache:
+    """基于 SQLite 的向量缓存，键为 (模型名, 规范化实体字符串)，值为 float32 向量
+
+    增量更新知识图谱时只需为缓存中没有的实体请求向量。
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, key TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, key))"
+        )
+        self._conn.commit()
+
+    def get_many(self, model, keys):
+        """批量读取向量，返回 {key: np.ndarray}，未命中的键不在结果中"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _QUERY_CHUNK):
+                chunk = keys[start:start + _QUERY_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({','.join('?' * len(chunk))})",
+                    (model, *chunk)
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model, vectors):
+        """批量写入 {key: 向量}"""
+        rows = []
+        for key, vector in vectors.items():
+            vector = np.asarray(vector, dtype=np.float32)
+            rows.append((model, key, vector.shape[0], vector.tobytes()))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, dim, vector) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def report(self):
+        stats = self.stats()
+        print(f"向量缓存: 命中 {stats['hits']} 个，未命中 {stats['misses']} 个，命中率 {stats['hit_rate']:.1%}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,135 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.rate_limiter import call_with_rate_limit
+
+# 单个批次的实体数与字符数上限
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_BATCH_CHARS = 8000
+# 同时在途的批次请求数
+DEFAULT_MAX_WORKERS = 8
+# 请求体格式："input" 为 OpenAI 兼容的批量格式 {"model", "input": [...]}；
+# "messages" 为对话格式 {"model", "messages": [{"role": "user", "content": 文本}]}，每个请求只能包含一个文本
+REQUEST_FORMATS = ("input", "messages")
+
+
+def make_batches(texts, batch_size=DEFAULT_BATCH_SIZE, batch_chars=DEFAULT_BATCH_CHARS):
+    """按数量与字符数将文本下标切分为批次，返回 [[下标, ...], ...]"""
+    batches, current, current_chars = [], [], 0
+    for index, text in enumerate(texts):
+        if current and (len(current) >= batch_size or current_chars + len(text) > batch_chars):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(index)
+        current_chars += len(text)
+    if current:
+        batches.append(current)
+    return batches
+
+
+class EmbeddingClient:
+    """批量向量化客户端
+
+    每个请求以 OpenAI 兼容格式 {"model": ..., "input": [...]} 发送一批文本，按响应中的 index
+    对应回输入顺序；接口只接受对话格式时设置 request_format="messages"，每个请求发送一个文本。
+    批次在线程池中并发发送，共用一个带连接池的 requests.Session；
+    429/5xx 由 rate_limiter 退避重试，其他失败的批次在所有批次结束后单独重试，最多 max_retries 轮。
+    还没有任何批次成功时出现 4xx（429 除外）说明请求格式或鉴权有误，直接抛出异常而不是重试。
+    """
+
+    def __init__(self, api_url, headers, model, batch_size=DEFAULT_BATCH_SIZE, batch_chars=DEFAULT_BATCH_CHARS,
+                 max_workers=DEFAULT_MAX_WORKERS, rate_limiter=None, max_retries=3, timeout=60,
+                 request_format="input"):
+        if request_format not in REQUEST_FORMATS:
+            raise ValueError(f"未知的请求体格式: {request_format}")
+        self.api_url = api_url
+        self.model = model
+        self.request_format = request_format
+        self.batch_size = batch_size if request_format == "input" else 1
+        self.batch_chars = batch_chars
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, texts):
+        if self.request_format == "input":
+            payload = {"model": self.model, "input": texts}
+        else:
+            payload = {"model": self.model, "messages": [{"role": "user", "content": texts[0]}]}
+        response = self.session.post(self.api_url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def embed_batch(self, texts):
+        """向量化一批文本，返回与输入顺序一致的向量列表"""
+        if self.rate_limiter is not None:
+            response = call_with_rate_limit(self.rate_limiter, self._post, texts)
+        else:
+            response = self._post(texts)
+        body = response.json()
+        data = (body.get("data") if isinstance(body, dict) else None) or []
+        if len(data) != len(texts):
+            raise ValueError(f"响应向量数 {len(data)} 与输入数 {len(texts)} 不一致")
+        # 错误对象或缺少字段的条目按失败处理，整批进入重试
+        for item in data:
+            if not isinstance(item, dict) or not isinstance(item.get("embedding"), list) or not item["embedding"]:
+                raise ValueError(f"响应中的向量条目格式错误: {str(item)[:200]}")
+        data = sorted(data, key=lambda item: item.get("index", 0))
+        return [item["embedding"] for item in data]
+
+    def embed(self, texts, on_batch=None):
+        """向量化全部文本，返回与输入顺序一致的向量列表，多次重试后仍失败的位置为 None
+
+        on_batch(已完成批次数, 总批次数) 在每个批次完成后调用，可用于打印进度。
+        """
+        texts = list(texts)
+        vectors = [None] * len(texts)
+        pending = make_batches(texts, self.batch_size, self.batch_chars)
+        total = len(pending)
+        done = 0
+
+        for attempt in range(self.max_retries + 1):
+            if not pending:
+                break
+            if attempt:
+                print(f"重试 {len(pending)} 个失败的批次（第 {attempt} 轮）")
+            failed = []
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {
+                    executor.submit(self.embed_batch, [texts[i] for i in batch]): batch for batch in pending
+                }
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    try:
+                        batch_vectors = future.result()
+                    except (requests.exceptions.RequestException, ValueError) as e:
+                        status = getattr(getattr(e, "response", None), "status_code", None)
+                        if not done and status and 400 <= status < 500 and status != 429:
+                            for other in futures:
+                                other.cancel()
+                            raise RuntimeError(
+                                f"向量接口返回 {status}，请检查 API 地址、鉴权与请求体格式"
+                                f"（当前 request_format={self.request_format}）: {str(e)}"
+                            ) from e
+                        print(f"批次请求失败（{len(batch)} 个实体）: {str(e)}")
+                        failed.append(batch)
+                        continue
+                    for index, vector in zip(batch, batch_vectors):
+                        vectors[index] = vector
+                    done += 1
+                    if on_batch is not None:
+                        on_batch(done, total)
+            pending = failed
+        return vectors
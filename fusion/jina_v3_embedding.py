@@ -1,9 +1,19 @@
-import requests
+import os
+import sys
+
 import json
-from time import sleep
+from embedding_cache import EmbeddingCache
+from embedding_client import EmbeddingClient
+from vector_store import write_vector_store
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.rate_limiter import AdaptiveRateLimiter
+from common.text_normalize import canonical_key
 
 # 配置信息
 API_URL = ""
+# 请求体格式：接口支持 OpenAI 兼容的批量格式时用 "input"，只接受对话格式（{"messages": [...]}）时用 "messages"
+REQUEST_FORMAT = "input"
 HEADERS = {
     "Authorization": "Bearer xiaoyu-embedding",
     "Content-Type": "application/json"
@@ -11,39 +21,43 @@ HEADERS = {
 MODEL_NAME = "jina-v3"
 INPUT_FILE = ""
 OUTPUT_FILE = ""
-
-
-def get_embedding(entity):
-    """调用API获取实体向量"""
-    payload = {
-        "model": MODEL_NAME,
-        "messages": [
-            {"role": "user", "content": entity}
-        ]
-    }
-
-    try:
-        response = requests.post(API_URL, headers=HEADERS, json=payload, timeout=30)
-        response.raise_for_status()
-
-        # 解析响应
-        response_data = response.json()
-        if response_data.get('data'):
-            return response_data['data'][0].get('embedding', [])
-        return []
-
-    except requests.exceptions.RequestException as e:
-        print(f"请求失败（{entity}）: {str(e)}")
-        return None
-
-
-def process_entities():
-    """处理所有实体并保存结果"""
-    # 读取JSON文件
-    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
+# 需要向量化的 (输入文件, 输出向量库目录)，可同时列出多种语言，相同字符串跨文件只向量化一次
+EMBEDDING_JOBS = [
+    (INPUT_FILE, OUTPUT_FILE),
+]
+# 向量库中向量的存储精度：float32 或 float16（体积减半）
+VECTOR_DTYPE = "float32"
+# 每个请求最多包含的实体数与字符数
+BATCH_SIZE = 64
+BATCH_CHARS = 8000
+# 同时在途的批次请求数
+MAX_WORKERS = 8
+# 每请求完成多少个字符串写回一次向量缓存，中途中断时已完成的部分不会丢失
+CACHE_FLUSH_SIZE = 5000
+
+# 向量缓存：按 (模型名, 规范化实体字符串) 持久化，增量更新时只请求新实体
+embedding_cache = EmbeddingCache()
+
+# 自适应限速：遇到 429/5xx 时降速，成功时逐步提速（按批次请求计）
+rate_limiter = AdaptiveRateLimiter(initial_rate=5.0, max_rate=50.0, name="embedding")
+embedding_client = EmbeddingClient(
+    API_URL,
+    HEADERS,
+    MODEL_NAME,
+    batch_size=BATCH_SIZE,
+    batch_chars=BATCH_CHARS,
+    max_workers=MAX_WORKERS,
+    rate_limiter=rate_limiter,
+    request_format=REQUEST_FORMAT,
+)
+
+
+def load_entity_types(input_file):
+    """读取实体文件，返回 {实体: [类型, ...]}，过滤无效的实体与类型"""
+    with open(input_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
 
-    entities_with_types = []
+    entity_types = {}
 
     for item in data:
         # 提取实体和类型
@@ -70,35 +84,67 @@ def process_entities():
             if not entity_type or entity_type.lower() == "null":
                 continue
 
-            entities_with_types.append({
-                "entity": entity,
-                "type": entity_type
-            })
-
-    results = []
-
-    for idx, entity_info in enumerate(entities_with_types, 1):
-        entity = entity_info["entity"]
-        entity_type = entity_info["type"]
-        print(f"正在处理 {idx}/{len(entities_with_types)}: [{entity_type}] {entity}")
+            known_types = entity_types.setdefault(entity, [])
+            if entity_type not in known_types:
+                known_types.append(entity_type)
 
-        embedding = get_embedding(entity)
+    return {entity: types for entity, types in entity_types.items() if types}
 
-        if embedding is not None:
-            results.append({
-                "entity": entity,
-                "type": entity_type,
-                "vector": embedding
-            })
 
-        # 避免频繁请求，根据需要调整间隔
-        sleep(0.1)
-
-    # 保存结果
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
-
-    print(f"处理完成！共成功处理 {len(results)} 个实体，结果已保存至 {OUTPUT_FILE}")
+def process_entities():
+    """处理所有实体并保存结果"""
+    jobs = [(output_file, load_entity_types(input_file)) for input_file, output_file in EMBEDDING_JOBS]
+
+    # 同一字符串（按规范化键，跨类型、跨文件）只向量化一次，取首次出现的写法请求
+    unique_texts = {}
+    row_count = 0
+    for _, entity_types in jobs:
+        for entity, types in entity_types.items():
+            row_count += len(types)
+            unique_texts.setdefault(canonical_key(entity), entity)
+    keys = list(unique_texts)
+    print(f"共 {row_count} 个（实体, 类型）组合，去重后需向量化 {len(keys)} 个字符串，"
+          f"节省 {row_count - len(keys)} 次向量化")
+
+    # 先查向量缓存，只为未缓存的字符串请求向量；每完成 CACHE_FLUSH_SIZE 个写回一次缓存
+    vector_of = embedding_cache.get_many(MODEL_NAME, keys)
+    missing = [key for key in keys if key not in vector_of]
+    print(f"向量缓存命中 {len(vector_of)} 个，需请求 {len(missing)} 个")
+    for start in range(0, len(missing), CACHE_FLUSH_SIZE):
+        chunk = missing[start:start + CACHE_FLUSH_SIZE]
+        # 批量请求向量，结果与 chunk 顺序一致
+        embeddings = embedding_client.embed(
+            [unique_texts[key] for key in chunk],
+            on_batch=lambda done, total: print(f"已完成批次 {done}/{total}（{start + len(chunk)}/{len(missing)}）")
+        )
+        new_vectors = {key: embedding for key, embedding in zip(chunk, embeddings) if embedding is not None}
+        embedding_cache.put_many(MODEL_NAME, new_vectors)
+        vector_of.update(new_vectors)
+
+    failed = [key for key in keys if key not in vector_of]
+    if failed:
+        # 多次重试后仍失败的字符串不写入向量库，不能当作成功结束
+        raise RuntimeError(f"{len(failed)}/{len(keys)} 个字符串向量化失败（如 {unique_texts[failed[0]]}），"
+                           f"已成功的向量已写入缓存，重新运行时只请求失败的部分")
+
+    # 每个实体输出一行，同一实体的多个类型共用一个向量
+    for output_file, entity_types in jobs:
+        results = []
+        for entity, types in entity_types.items():
+            embedding = vector_of.get(canonical_key(entity))
+            if embedding is not None:
+                results.append({
+                    "entity": entity,
+                    "types": types,
+                    "vector": embedding
+                })
+
+        # 保存为内存映射向量库（similarity.py 按类型直接读取）
+        write_vector_store(output_file, results, dtype=VECTOR_DTYPE)
+
+        print(f"处理完成！共成功处理 {len(results)} 个实体，结果已保存至 {output_file}")
+    embedding_cache.report()
+    rate_limiter.report()
 
 
 if __name__ == "__main__":
@@ -1,42 +1,219 @@
 import json
+import multiprocessing
 import numpy as np
 from tqdm import tqdm
-from collections import defaultdict
+from collections import Counter, defaultdict
 import os
+import sys
+import tempfile
+from ann_index import load_index, load_or_build_index
+from candidate_pruning import prune_candidates
+from vector_store import VectorStore, is_vector_store
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.json_stream import iter_json_array
+
+
+# 每个源实体保留的候选数
+TOP_K = 10
+# 分块检索时单个块的内存上限（相似度矩阵、取负副本与 argpartition 下标合计，约每元素 16 字节）
+MAX_BLOCK_BYTES = 256 * 1024 ** 2
+# 近似检索时每次查询的源实体数
+ANN_BLOCK_ROWS = 4096
+# 控制 BLAS 线程数的环境变量，并行模式下在启动子进程前设置，避免进程数 × 线程数超过核数
+BLAS_THREAD_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                    "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+def iter_topk(src_matrix, tgt_matrix, k=TOP_K, max_block_bytes=MAX_BLOCK_BYTES):
+    """分块计算源向量与目标矩阵的 Top-k 余弦相似度（向量均已归一化）
+
+    每块一次矩阵乘法，再沿 axis=1 批量 argpartition；块大小由 max_block_bytes 决定。
+    逐块产出 (块起始行, Top-k 下标, Top-k 相似度)，每行按相似度降序排列。
+    """
+    num_targets = tgt_matrix.shape[0]
+    k = min(k, num_targets)
+    if k == 0:
+        return
+    block_size = max(1, max_block_bytes // (16 * num_targets))
+    for start in range(0, src_matrix.shape[0], block_size):
+        block = np.asarray(src_matrix[start:start + block_size], dtype=np.float32)
+        cosine_sim = block @ tgt_matrix.T
+        if k < num_targets:
+            top_indices = np.argpartition(-cosine_sim, k - 1, axis=1)[:, :k]
+        else:
+            top_indices = np.broadcast_to(np.arange(num_targets), cosine_sim.shape)
+        top_sim = np.take_along_axis(cosine_sim, top_indices, axis=1)
+
+        # 精确排序
+        order = np.argsort(-top_sim, axis=1)
+        yield start, np.take_along_axis(top_indices, order, axis=1), np.take_along_axis(top_sim, order, axis=1)
+
+
+def iter_topk_ann(src_matrix, index, k=TOP_K, block_rows=ANN_BLOCK_ROWS):
+    """用 ANN 索引（见 ann_index.py）分块检索 Top-k，产出格式与 iter_topk 相同"""
+    for start in range(0, src_matrix.shape[0], block_rows):
+        top_indices, top_sim = index.search(src_matrix[start:start + block_rows], k)
+        yield start, top_indices, top_sim
+
+
+def expand_types(ent):
+    """兼容两种向量文件格式：每行一个类型 {"entity","type","vector"}，
+    或同一实体多个类型共用向量 {"entity","types","vector"}，统一返回该实体的类型列表"""
+    return ent['types'] if 'types' in ent else [ent['type']]
 
 
 def load_entities(file_path):
-    """加载实体数据并按类型分组+归一化处理"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        raw_entities = json.load(f)
+    """加载实体数据并按类型分组+归一化处理
 
-    # 按类型分组
-    type_groups = defaultdict(list)
-    for ent in raw_entities:
-        type_groups[ent['type']].append(ent)
+    file_path 为向量库目录（见 vector_store.py）时直接以内存映射方式按类型读取，
+    否则流式解析 JSON 向量文件：第一遍统计每个类型的行数与维度，第二遍把向量直接写入预分配的
+    float32 矩阵，峰值内存约等于矩阵本身，不保留解析出的原始 JSON。
+    """
+    if is_vector_store(file_path):
+        store = VectorStore(file_path)
+        by_type = {}
+        for ent_type in store.types():
+            matrix, names = store.block(ent_type)
+            start, end = store.rows(ent_type)
+            # source 供并行模式的子进程以内存映射方式打开同一块数据
+            by_type[ent_type] = {'matrix': matrix, 'names': names,
+                                 'source': (store.vectors_path, start, end)}
+        return {'by_type': by_type}
 
-    # 对每个类型进行归一化处理
-    processed = {}
-    for ent_type, entities in type_groups.items():
-        vectors = [e['vector'] for e in entities]
-        matrix = np.array(vectors, dtype=np.float32)
+    # 第一遍：按类型计数
+    type_counts = Counter()
+    dim = 0
+    for ent in iter_json_array(file_path):
+        dim = dim or len(ent['vector'])
+        type_counts.update(expand_types(ent))
 
-        # L2归一化
-        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
-        norms[norms == 0] = 1.0
-        matrix_normalized = matrix / norms
+    # 第二遍：按类型填充预分配的矩阵
+    processed = {
+        ent_type: {'matrix': np.empty((count, dim), dtype=np.float32), 'names': []}
+        for ent_type, count in type_counts.items()
+    }
+    for ent in iter_json_array(file_path):
+        for ent_type in expand_types(ent):
+            group = processed[ent_type]
+            group['matrix'][len(group['names'])] = ent['vector']
+            group['names'].append(ent['entity'])
 
-        processed[ent_type] = {
-            'matrix': matrix_normalized,
-            'names': [e['entity'] for e in entities]
-        }
+    # 对每个类型进行归一化处理
+    for group in processed.values():
+        # L2归一化（原地）
+        norms = np.linalg.norm(group['matrix'], axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        group['matrix'] /= norms
 
     return {
-        'all_entities': raw_entities,  # 保留原始数据用于遍历
         'by_type': processed  # 归一化后的分类数据
     }
 
 
+# 子进程内缓存已打开的内存映射文件、float32 目标矩阵与 ANN 索引
+_worker_arrays = {}
+_worker_targets = {}
+_worker_indexes = {}
+
+
+def _open_rows(source):
+    path, start, end = source
+    if path not in _worker_arrays:
+        _worker_arrays[path] = np.load(path, mmap_mode='r')
+    return _worker_arrays[path][start:end]
+
+
+def _search_shard(task):
+    """进程池工作函数：检索一个 (语言对, 类型, 源实体块) 分片，返回 (Top-k 下标, Top-k 相似度)"""
+    src_source, tgt_source, index_dir = task
+    if tgt_source not in _worker_targets:
+        _worker_targets[tgt_source] = np.asarray(_open_rows(tgt_source), dtype=np.float32)
+    tgt_matrix = _worker_targets[tgt_source]
+    src_matrix = _open_rows(src_source)
+
+    if index_dir:
+        if index_dir not in _worker_indexes:
+            _worker_indexes[index_dir] = load_index(index_dir)
+        blocks = iter_topk_ann(src_matrix, _worker_indexes[index_dir])
+    else:
+        blocks = iter_topk(src_matrix, tgt_matrix)
+    blocks = list(blocks)
+    if not blocks:
+        return np.empty((src_matrix.shape[0], 0), dtype=np.int64), np.empty((src_matrix.shape[0], 0), dtype=np.float32)
+    return np.concatenate([b[1] for b in blocks]), np.concatenate([b[2] for b in blocks])
+
+
+def run_shards(tasks, workers, blas_threads):
+    """在 spawn 进程池中按顺序产出各分片的检索结果
+
+    子进程只收到文件路径与行区间，自行以内存映射方式打开向量，不经 pickle 传递矩阵。
+    """
+    for var in BLAS_THREAD_VARS:
+        os.environ[var] = str(blas_threads)
+    with multiprocessing.get_context('spawn').Pool(workers) as pool:
+        yield from pool.imap(_search_shard, tasks)
+
+
+def add_matches(results, pair_key, src_type, src_names, tgt_names, top_indices, top_sims, threshold,
+                scores=None, keep=None, certain=None):
+    """将一块源实体的 Top-k 检索结果按阈值过滤后写入 results
+
+    scores / keep / certain 为 candidate_pruning.prune_candidates 的剪枝结果：keep 给出时按掩码取候选，
+    scores 写入每个候选的 "csls" 字段，certain 中的确定匹配写入 "certain" 字段供对齐脚本直接接受。
+    """
+    for row, (src_name, indices, sims) in enumerate(zip(src_names, top_indices, top_sims)):
+        # 构建匹配结果
+        matches = []
+        for col, (idx, sim) in enumerate(zip(indices, sims)):
+            if keep is None:
+                if sim < threshold:
+                    break
+            elif not keep[row, col]:
+                continue
+            match = {
+                "entity": tgt_names[idx],
+                "similarity": float(sim),
+                "type": src_type
+            }
+            if scores is not None:
+                match["csls"] = float(scores[row, col])
+            matches.append(match)
+
+        # 保存匹配结果
+        if matches:
+            results[src_name] = {
+                "type": src_type,
+                "matches": {pair_key: matches}
+            }
+            if certain is not None and certain[row] >= 0:
+                results[src_name]["certain"] = {pair_key: tgt_names[certain[row]]}
+
+
+def merge_matches(results, pair_key, src_type, src_names, tgt_names, top_indices, top_sims, threshold,
+                  type_order, replace=False, k=TOP_K):
+    """增量模式下把检索结果合并进 results，结果与全量计算一致
+
+    全量计算按 type_order 的顺序处理类型，同一实体有多个类型时，排在后面且有候选的类型覆盖前面的类型。
+    合并时遵循同一规则：已有条目的类型排在前面时被覆盖，排在后面时保留；类型相同时，replace 为 True
+    （新增源实体，候选来自全部目标实体）直接替换，否则（已有源实体 × 新增目标实体）合并后保留相似度最高的 k 个。
+    """
+    rank = {ent_type: i for i, ent_type in enumerate(type_order)}
+    for src_name, indices, sims in zip(src_names, top_indices, top_sims):
+        new_matches = [
+            {"entity": tgt_names[idx], "similarity": float(sim), "type": src_type}
+            for idx, sim in zip(indices, sims) if sim >= threshold
+        ]
+        if not new_matches:
+            continue
+        entry = results.get(src_name)
+        if entry is not None and entry["type"] == src_type and not replace:
+            merged = sorted(entry["matches"][pair_key] + new_matches, key=lambda m: -m["similarity"])
+            entry["matches"][pair_key] = merged[:k]
+        elif entry is None or rank[src_type] >= rank.get(entry["type"], -1):
+            results[src_name] = {"type": src_type, "matches": {pair_key: new_matches[:k]}}
+
+
 def main():
     # 配置参数
     paths = {
@@ -46,6 +223,31 @@ def main():
     }
     output_dir = ''  # 输出目录
     similarity_threshold = 0.7
+    # 近似检索：None 为精确检索，"ivf" 或 "hnsw"（需安装 hnswlib）时对目标实体数不少于
+    # ann_min_targets 的类型建立 ANN 索引，索引按 (语言, 类型) 持久化在 ann_index_dir 下并在各语言对间复用
+    ann_backend = None
+    ann_min_targets = 20000
+    ann_index_dir = os.path.join(output_dir, 'ann_index')
+    # 并行模式：parallel_workers > 0 时把 (语言对, 类型, 每 shard_rows 个源实体) 分发到进程池，
+    # 每个子进程的 BLAS 线程数为 blas_threads
+    parallel_workers = 0
+    blas_threads = 1
+    shard_rows = 20000
+    # 候选剪枝：None 为不剪枝，"mutual" 只保留互为 Top-k 近邻的候选，"csls" 按 CSLS 分数重排并只保留
+    # 与最优候选相差不超过 csls_margin 的候选；两种模式都需要额外做一次目标 → 源的反向检索，
+    # 并把互为第一近邻、相似度不低于 certain_similarity 且两个方向领先第二名至少 certain_margin 的
+    # 一对一匹配标记为 "certain"
+    prune_mode = None
+    csls_margin = 0.1
+    certain_similarity = 0.9
+    certain_margin = 0.05
+    # 增量模式：根据 output_dir 下上次运行记录的实体名（similarity_state.json）找出新增实体，
+    # 只计算 新增源实体 × 全部目标实体 与 已有源实体 × 新增目标实体，并合并进已有的输出文件；
+    # 要求已有实体的向量不变（向量缓存保证），删除实体或开启 prune_mode 时需全量计算。增量计算在单进程中进行
+    incremental = False
+    state_path = os.path.join(output_dir, 'similarity_state.json')
+    # 影响输出内容的设置，与上次运行不同时增量模式改为全量计算
+    settings = {'prune_mode': prune_mode, 'similarity_threshold': similarity_threshold, 'top_k': TOP_K}
 
     # 需要处理的语言对组合及文件名映射
     ALLOWED_PAIRS = [
@@ -62,77 +264,178 @@ def main():
     # 加载所有数据
     print("Loading data...")
     lang_data = {lang: load_entities(path) for lang, path in paths.items()}
+    ann_indexes = {}
 
-    # 处理每个语言对
-    for src_lang, tgt_lang in ALLOWED_PAIRS:
-        print(f"\nProcessing language pair: {src_lang}->{tgt_lang}")
-        results = {}
-
-        # 获取源语言的所有实体
-        src_entities = lang_data[src_lang]['all_entities']
-        # 获取目标语言的类型数据
-        tgt_type_data = lang_data[tgt_lang]['by_type']
-
-        # 遍历源实体
-        for src_ent in tqdm(src_entities, desc=f"{src_lang}->{tgt_lang}"):
-            src_type = src_ent['type']
-            # 跳过目标语言中没有的类型
-            if src_type not in tgt_type_data:
-                continue
+    def target_index(tgt_lang, ent_type, tgt_matrix):
+        """需要时构建或加载 (目标语言, 类型) 的 ANN 索引，返回 (索引目录, 索引)"""
+        if not ann_backend or tgt_matrix.shape[0] < ann_min_targets:
+            return None, None
+        index_dir = os.path.join(ann_index_dir, f"{tgt_lang}-{ent_type}-{ann_backend}")
+        if index_dir not in ann_indexes:
+            ann_indexes[index_dir] = load_or_build_index(
+                tgt_matrix, index_dir, backend=ann_backend, names=lang_data[tgt_lang]['by_type'][ent_type]['names'])
+        return index_dir, ann_indexes[index_dir]
 
-            # 源向量归一化
-            src_vector = np.array(src_ent['vector'], dtype=np.float32)
-            src_norm = np.linalg.norm(src_vector)
-            if src_norm == 0:
-                src_vector_normalized = src_vector
-            else:
-                src_vector_normalized = src_vector / src_norm
+    def search(query_matrix, base_lang, ent_type, base_matrix):
+        """逐块检索 query_matrix 在 (base_lang, ent_type) 向量中的 Top-k"""
+        # 向量已归一化，float16 向量库在此转为 float32
+        base_matrix = np.asarray(base_matrix, dtype=np.float32)
+        _, index = target_index(base_lang, ent_type, base_matrix)
+        if index is not None:
+            return iter_topk_ann(query_matrix, index)
+        return iter_topk(query_matrix, base_matrix)
+
+    # 每个语言对中两种语言共有的类型，按类型名排序：同一实体有多个类型时后处理的类型覆盖先处理的，
+    # 固定顺序使全量与增量计算的结果一致，不受输入文件中类型出现顺序的影响
+    type_order = {src_lang: sorted(lang_data[src_lang]['by_type']) for src_lang, _ in ALLOWED_PAIRS}
+    pair_types = [
+        (src_lang, tgt_lang, src_type)
+        for src_lang, tgt_lang in ALLOWED_PAIRS
+        for src_type in type_order[src_lang]
+        if src_type in lang_data[tgt_lang]['by_type']
+    ]
+    pair_results = {(src_lang, tgt_lang): {} for src_lang, tgt_lang in ALLOWED_PAIRS}
+    output_paths = {
+        (src_lang, tgt_lang): os.path.join(output_dir, f"{lang_display_map[src_lang]}-{lang_display_map[tgt_lang]}.json")
+        for src_lang, tgt_lang in ALLOWED_PAIRS
+    }
 
-            # 获取目标语言同类型数据
-            tgt_matrix = tgt_type_data[src_type]['matrix']
-            tgt_names = tgt_type_data[src_type]['names']
+    # 上次运行已处理的实体名 {语言: {类型: [实体名]}}，为 None 时全量计算
+    known = None
+    if incremental:
+        state = None
+        if os.path.exists(state_path) and all(os.path.exists(p) for p in output_paths.values()):
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        if prune_mode:
+            print("增量模式不支持候选剪枝（CSLS 与互为近邻依赖全部实体），改为全量计算")
+        elif state is None:
+            print("未找到上次运行的结果，改为全量计算")
+        elif state.get('settings') != settings:
+            print(f"上次运行的设置 {state.get('settings')} 与本次 {settings} 不同，改为全量计算")
+        else:
+            known = state['entities']
+            for pair, output_path in output_paths.items():
+                with open(output_path, 'r', encoding='utf-8') as f:
+                    pair_results[pair] = json.load(f)
 
-            # 计算余弦相似度
-            cosine_sim = np.dot(tgt_matrix, src_vector_normalized)
+    def collect(src_lang, tgt_lang, src_type, offset, top_indices, top_sims, reverse):
+        """剪枝（如开启）后把一块检索结果写入对应语言对的结果"""
+        pair_key = f"{src_lang}->{tgt_lang}"
+        src_names = lang_data[src_lang]['by_type'][src_type]['names'][offset:offset + len(top_indices)]
+        tgt_names = lang_data[tgt_lang]['by_type'][src_type]['names']
+        pruned = {}
+        if prune_mode:
+            top_indices, top_sims, scores, keep, certain = prune_candidates(
+                offset, top_indices, top_sims, *reverse, similarity_threshold, mode=prune_mode,
+                csls_margin=csls_margin, certain_similarity=certain_similarity, certain_margin=certain_margin)
+            pruned = {'scores': scores, 'keep': keep, 'certain': certain}
+        add_matches(pair_results[(src_lang, tgt_lang)], pair_key, src_type, src_names, tgt_names,
+                    top_indices, top_sims, similarity_threshold, **pruned)
 
-            # 取Top-10并过滤
-            top_indices = np.argpartition(-cosine_sim, 10)[:10]
-            top_sim = cosine_sim[top_indices]
+    if known is not None:
+        for src_lang, tgt_lang, src_type in pair_types:
+            pair_key = f"{src_lang}->{tgt_lang}"
+            results = pair_results[(src_lang, tgt_lang)]
+            src_data = lang_data[src_lang]['by_type'][src_type]
+            tgt_data = lang_data[tgt_lang]['by_type'][src_type]
+            src_known = set(known.get(src_lang, {}).get(src_type, []))
+            tgt_known = set(known.get(tgt_lang, {}).get(src_type, []))
+            new_src = np.array([i for i, name in enumerate(src_data['names']) if name not in src_known], dtype=np.int64)
+            new_tgt = np.array([i for i, name in enumerate(tgt_data['names']) if name not in tgt_known], dtype=np.int64)
+            print(f"{pair_key} [{src_type}]: 新增源实体 {len(new_src)} 个，新增目标实体 {len(new_tgt)} 个")
 
-            # 精确排序
-            sorted_order = np.argsort(-top_sim)
-            top_indices = top_indices[sorted_order]
-            top_sim = top_sim[sorted_order]
+            # 新增源实体 × 全部目标实体
+            if len(new_src):
+                blocks = search(src_data['matrix'][new_src], tgt_lang, src_type, tgt_data['matrix'])
+                for offset, top_indices, top_sims in blocks:
+                    src_names = [src_data['names'][i] for i in new_src[offset:offset + len(top_indices)]]
+                    merge_matches(results, pair_key, src_type, src_names, tgt_data['names'], top_indices, top_sims,
+                                  similarity_threshold, type_order[src_lang], replace=True)
 
-            # 构建匹配结果
-            matches = []
-            for idx, sim in zip(top_indices, top_sim):
-                if sim < similarity_threshold:
-                    break
-                matches.append({
-                    "entity": tgt_names[idx],
-                    "similarity": float(sim),
-                    "type": src_type
-                })
-
-            # 保存匹配结果
-            if matches:
-                pair_key = f"{src_lang}->{tgt_lang}"
-                results[src_ent['entity']] = {
-                    "type": src_type,
-                    "matches": {pair_key: matches}
-                }
-
-        # 生成输出路径
-        src_display = lang_display_map[src_lang]
-        tgt_display = lang_display_map[tgt_lang]
-        output_path = os.path.join(output_dir, f"{src_display}-{tgt_display}.json")
+            # 已有源实体 × 新增目标实体，合并进已有候选；新增源实体已在上一步与全部目标比较过，跳过
+            if len(new_tgt) and len(new_src) < len(src_data['names']):
+                is_new_src = np.zeros(len(src_data['names']), dtype=bool)
+                is_new_src[new_src] = True
+                new_tgt_names = [tgt_data['names'][i] for i in new_tgt]
+                new_tgt_matrix = np.asarray(tgt_data['matrix'][new_tgt], dtype=np.float32)
+                for offset, top_indices, top_sims in iter_topk(src_data['matrix'], new_tgt_matrix):
+                    old = np.flatnonzero(~is_new_src[offset:offset + len(top_indices)])
+                    merge_matches(results, pair_key, src_type, [src_data['names'][offset + i] for i in old],
+                                  new_tgt_names, top_indices[old], top_sims[old], similarity_threshold,
+                                  type_order[src_lang])
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            if parallel_workers > 0:
+                # JSON 输入没有可供子进程映射的文件，先按类型写成临时 .npy
+                for lang, data in lang_data.items():
+                    for ent_type, type_data in data['by_type'].items():
+                        if 'source' not in type_data:
+                            path = os.path.join(tmp_dir, f"{lang}-{len(os.listdir(tmp_dir))}.npy")
+                            np.save(path, type_data['matrix'])
+                            type_data['source'] = (path, 0, len(type_data['names']))
+
+                tasks, shards = [], []
+                for src_lang, tgt_lang, src_type in pair_types:
+                    src_data = lang_data[src_lang]['by_type'][src_type]
+                    tgt_data = lang_data[tgt_lang]['by_type'][src_type]
+                    # 剪枝需要的反向检索分片排在正向分片之前，imap 按顺序返回，处理正向分片时反向结果已齐全
+                    directions = [('forward', tgt_lang, src_data, tgt_data)]
+                    if prune_mode:
+                        directions.insert(0, ('reverse', src_lang, tgt_data, src_data))
+                    for direction, base_lang, query_data, base_data in directions:
+                        # 在主进程中预先构建 ANN 索引，子进程直接加载
+                        index_dir, _ = target_index(base_lang, src_type, base_data['matrix'])
+                        path, start, end = query_data['source']
+                        for offset in range(0, end - start, shard_rows):
+                            query_source = (path, start + offset, min(end, start + offset + shard_rows))
+                            tasks.append((query_source, base_data['source'], index_dir))
+                            shards.append((direction, src_lang, tgt_lang, src_type, offset))
+
+                print(f"Parallel mode: {len(tasks)} shards, {parallel_workers} workers x {blas_threads} BLAS threads")
+                shard_results = run_shards(tasks, parallel_workers, blas_threads)
+                reverse_parts, reverses = defaultdict(list), {}
+                for (direction, src_lang, tgt_lang, src_type, offset), (top_indices, top_sims) in tqdm(
+                        zip(shards, shard_results), total=len(tasks), desc="shards"):
+                    key = (src_lang, tgt_lang, src_type)
+                    if direction == 'reverse':
+                        reverse_parts[key].append((top_indices, top_sims))
+                        continue
+                    if prune_mode and key not in reverses:
+                        parts = reverse_parts.pop(key)
+                        reverses[key] = (np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts]))
+                    collect(src_lang, tgt_lang, src_type, offset, top_indices, top_sims, reverses.get(key))
+            else:
+                for src_lang, tgt_lang, src_type in pair_types:
+                    pair_key = f"{src_lang}->{tgt_lang}"
+                    src_data = lang_data[src_lang]['by_type'][src_type]
+                    tgt_data = lang_data[tgt_lang]['by_type'][src_type]
+
+                    reverse = None
+                    if prune_mode:
+                        blocks = list(search(tgt_data['matrix'], src_lang, src_type, src_data['matrix']))
+                        reverse = (np.concatenate([b[1] for b in blocks]), np.concatenate([b[2] for b in blocks]))
+                    blocks = search(src_data['matrix'], tgt_lang, src_type, tgt_data['matrix'])
+                    for offset, top_indices, top_sims in tqdm(blocks, desc=f"{pair_key} [{src_type}]"):
+                        collect(src_lang, tgt_lang, src_type, offset, top_indices, top_sims, reverse)
+
+    for pair, results in pair_results.items():
+        output_path = output_paths[pair]
 
         # 保存JSON文件
         print(f"Saving results to {output_path}")
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(results, f, ensure_ascii=False, indent=2)
 
+    # 记录本次的设置与已处理的实体，供下次增量计算
+    state = {
+        'settings': settings,
+        'entities': {lang: {ent_type: type_data['names'] for ent_type, type_data in data['by_type'].items()}
+                     for lang, data in lang_data.items()}
+    }
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
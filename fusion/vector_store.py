@@ -0,0 +1,76 @@
+import json
+import os
+
+import numpy as np
+
+STORE_VERSION = 1
+VECTORS_FILE = "vectors.npy"
+NAMES_FILE = "names.json"
+META_FILE = "meta.json"
+
+
+def is_vector_store(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+
+def write_vector_store(directory, entities, dtype="float32"):
+    """将 [{"entity", "types", "vector"}] 写为向量库目录
+
+    vectors.npy 为按类型连续分块的 L2 归一化矩阵（float32 或 float16），同一实体的多个类型各占一行；
+    names.json 为与行号对应的实体名；meta.json 记录维度、数据类型与每个类型的行区间 [start, end)。
+    """
+    by_type = {}
+    for ent in entities:
+        for ent_type in ent["types"]:
+            by_type.setdefault(ent_type, []).append(ent)
+    total = sum(len(group) for group in by_type.values())
+    dim = len(entities[0]["vector"]) if entities else 0
+
+    os.makedirs(directory, exist_ok=True)
+    matrix = np.lib.format.open_memmap(os.path.join(directory, VECTORS_FILE), mode="w+",
+                                       dtype=np.dtype(dtype), shape=(total, dim))
+    names, ranges = [], {}
+    start = 0
+    for ent_type, group in by_type.items():
+        block = np.array([ent["vector"] for ent in group], dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix[start:start + len(group)] = block / norms
+        names.extend(ent["entity"] for ent in group)
+        ranges[ent_type] = [start, start + len(group)]
+        start += len(group)
+    matrix.flush()
+    del matrix
+
+    with open(os.path.join(directory, NAMES_FILE), "w", encoding="utf-8") as f:
+        json.dump(names, f, ensure_ascii=False)
+    meta = {"version": STORE_VERSION, "dim": dim, "dtype": np.dtype(dtype).name, "normalized": True,
+            "types": ranges}
+    with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+
+class VectorStore:
+    """以内存映射方式打开的向量库，按类型取出连续的向量块，只有实际访问的部分才会读入内存"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(directory, NAMES_FILE), "r", encoding="utf-8") as f:
+            self.names = json.load(f)
+        self.vectors_path = os.path.join(directory, VECTORS_FILE)
+        self.vectors = np.load(self.vectors_path, mmap_mode="r")
+
+    def types(self):
+        return list(self.meta["types"])
+
+    def rows(self, ent_type):
+        """返回该类型在 vectors.npy 中的行区间 (start, end)"""
+        start, end = self.meta["types"][ent_type]
+        return start, end
+
+    def block(self, ent_type):
+        """返回 (该类型的归一化向量矩阵, 实体名列表)，矩阵为内存映射的视图"""
+        start, end = self.rows(ent_type)
+        return self.vectors[start:end], self.names[start:end]
@@ -1,10 +1,17 @@
 import json
+import os
+import sys
 from openai import AsyncOpenAI
 import asyncio
+from collections import Counter
 from typing import Dict, List, Tuple
 from tenacity import retry, wait_random_exponential, stop_after_attempt
 from tqdm.asyncio import tqdm_asyncio
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.llm_cache import LLMCache, acached_chat_completion
+from common.rate_limiter import AdaptiveRateLimiter
+
 # 配置客户端
 client = AsyncOpenAI(
     base_url="",
@@ -18,6 +25,13 @@ BATCH_SIZE = 5
 RETRY_TIMES = 2
 TYPE_MATCH_THRESHOLD = 0.8
 
+# LLM 响应缓存：相同实体与候选列表的对齐请求直接复用结果
+llm_cache = LLMCache()
+# 自适应限速：MAX_CONCURRENT_REQUESTS 只限制同时在途的请求数，实际发送速率随 429/5xx 自动调整
+rate_limiter = AdaptiveRateLimiter(initial_rate=10.0, max_rate=100.0, name="alignment")
+# similarity.py 剪枝时标记的确定匹配（"certain" 字段）直接接受，不调用 LLM
+alignment_stats = Counter()
+
 def build_alignment_prompt(source_entity: str, entity_type: str, candidates: List[Dict], lang_pair: str) -> str:
 
     lang_config = {
@@ -58,12 +72,14 @@ def build_alignment_prompt(source_entity: str, entity_type: str, candidates: Lis
 async def api_request(prompt: str) -> str:
     """适配新版SDK的API请求"""
     try:
-        response = await client.chat.completions.create(
+        return await acached_chat_completion(
+            client,
+            llm_cache,
+            rate_limiter=rate_limiter,
             model=MODEL_NAME,
             messages=[{"role": "user", "content": prompt}],
             temperature=0,
         )
-        return response.choices[0].message.content
     except Exception as e:
         print(f"API请求失败: {str(e)}")
         raise
@@ -96,11 +112,15 @@ def parse_response(response: str) -> List[Tuple]:
         print(f"原始响应内容:\n{response}")
         return []
 
-async def process_lang_pair(source_entity: str, source_type: str, candidates: List[Dict], lang_pair: str) -> List[Tuple]:
+async def process_lang_pair(source_entity: str, source_type: str, candidates: List[Dict], lang_pair: str,
+                            certain: str = None) -> List[Tuple]:
     """处理单个语言方向（仅zh->vi）"""
     filtered = filter_candidates(source_type, candidates)
     if not filtered:
         return []
+    if certain and any(item["entity"] == certain for item in filtered):
+        alignment_stats["auto_accepted"] += 1
+        return [(source_entity, "equal", certain)]
 
     try:
         prompt = build_alignment_prompt(source_entity, source_type, filtered, lang_pair)
@@ -125,7 +145,8 @@ async def process_entity_batch(entity_batch: List[Tuple], semaphore: asyncio.Sem
                 entity_name,
                 entity_data["type"],
                 entity_data["matches"].get("zh->vi", []),
-                "zh->vi"
+                "zh->vi",
+                entity_data.get("certain", {}).get("zh->vi")
             )
             all_tasks.append(task)
 
@@ -152,6 +173,9 @@ async def main(input_file: str, output_file: str):
 
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"确定匹配直接接受 {alignment_stats['auto_accepted']} 个，节省等量 LLM 调用")
+    llm_cache.report()
+    rate_limiter.report()
 
 if __name__ == "__main__":
     asyncio.run(main("",
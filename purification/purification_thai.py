@@ -1,7 +1,16 @@
+import asyncio
 import json
 import os
-from openai import OpenAI
+import sys
+from openai import AsyncOpenAI
 from tqdm import tqdm
+from triage import TriageStats, triage_extraction
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.extraction_result import article_extraction
+from common.llm_cache import LLMCache
+from common.rate_limiter import AdaptiveRateLimiter, acall_with_rate_limit
+from common.result_store import ResultStore
 
 # 配置参数
 CONFIG = {
@@ -12,9 +21,12 @@ CONFIG = {
         "registered_address", "branch_address", "work_address",
         "belong", "participate"],
     "model_name": "deepseek-chat",
+    # 同时在途的请求数上限
+    "max_concurrency": 20,
+    # 单篇文章返回的 JSON 无效时的最大尝试次数
+    "max_retries": 3,
     "api_key": "",
     "base_url": "",
-    "save_interval": 100  # 新增保存间隔
 }
 
 SYSTEM_PROMPT = f"""
@@ -48,21 +60,21 @@ project（项目）：投资/合作项目名称
    - 文本中未明确提及的信息
 """
 
-client = OpenAI(api_key=CONFIG["api_key"], base_url=CONFIG["base_url"])
+client = AsyncOpenAI(api_key=CONFIG["api_key"], base_url=CONFIG["base_url"])
 
+# LLM 响应缓存：只缓存能解析为 JSON 的响应
+llm_cache = LLMCache()
+# 自适应限速：遇到 429/5xx 时降速，成功时逐步提速
+rate_limiter = AdaptiveRateLimiter(initial_rate=5.0, max_rate=50.0, name="purification")
+# 记录规则预筛剔除的三元组与跳过模型调用的文章
+triage_stats = TriageStats()
 
-def purify_entities(article):
-    """实体关系提纯核心函数"""
-    # 处理数据类型异常
-    entity_relationship = article.get('entity_relationship', {})
 
-    # 处理字符串类型的entity_relationship
-    if isinstance(entity_relationship, str):
-        try:
-            entity_relationship = json.loads(entity_relationship)
-        except json.JSONDecodeError:
-            entity_relationship = {"entities": [], "triplet": []}
+async def purify_entities(article, entity_relationship, semaphore):
+    """实体关系提纯核心函数，entity_relationship 为规则预筛后的抽取结果
 
+    返回的 JSON 无法解析或缺少字段时，只对该文章单独重试（最多 max_retries 次）。
+    """
     messages = [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": f"""
@@ -73,106 +85,136 @@ def purify_entities(article):
         """}
     ]
 
-    for _ in range(3):  # 重试机制
+    params = dict(
+        model=CONFIG["model_name"],
+        messages=messages,
+        temperature=0.1,
+        response_format={"type": "json_object"}
+    )
+    cache_key = llm_cache.make_key(sample=None, **params)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        return json.loads(cached)
+
+    for attempt in range(CONFIG["max_retries"]):
         try:
-            response = client.chat.completions.create(
-                model=CONFIG["model_name"],
-                messages=messages,
-                temperature=0.1,
-                response_format={"type": "json_object"}
-            )
-            result = json.loads(response.choices[0].message.content)
-            return result
+            async with semaphore:
+                response = await acall_with_rate_limit(rate_limiter, client.chat.completions.create, **params)
+            content = response.choices[0].message.content
+            result = json.loads(content)
+            if "purified_entities" not in result or "purified_triples" not in result:
+                raise json.JSONDecodeError("缺少 purified_entities / purified_triples 字段", content, 0)
         except json.JSONDecodeError:
+            tqdm.write(f" 文章 {article['article_id']} 第 {attempt + 1} 次返回的 JSON 无效，重试")
             continue
         except Exception as e:
-            print(f"API Error: {str(e)}")
+            tqdm.write(f"API Error: {str(e)}")
             break
+        llm_cache.put(cache_key, content)
+        return result
     return None
 
 
-def save_data(data, file_path):
-    """保存数据到指定文件"""
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-
-def process_articles():
-    """主处理流程"""
-    # 读取输入文件
-    with open(CONFIG["input_file"], 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    # 数据预处理：确保entity_relationship为字典类型
+async def process_article(article, semaphore):
+    """提纯单篇文章，返回 purified_entities / purified_triples"""
+    # 规则预筛：剔除空值、指代词以及关系或类型不匹配的三元组，没有待验证的三元组时不调用模型
+    triaged, dropped = triage_extraction(article['entity_relationship'], CONFIG["allowed_relations"])
+    settled = not triaged["triplet"]
+    triage_stats.record(triaged, dropped, settled)
+
+    # 执行提纯
+    if settled:
+        tqdm.write(f" 文章 {article['article_id']} 规则预筛后没有待验证的三元组，跳过模型调用")
+        purified = {"purified_entities": triaged["entities"], "purified_triples": []}
+    else:
+        purified = await purify_entities(article, triaged, semaphore)
+
+    if not purified:
+        return {
+            "purified_entities": {"enterprise": [], "person": [], "location": [], "project": []},
+            "purified_triples": []
+        }
+
+    # 输出对比信息
+    original_triples = '\n'.join([f" - {t}" for t in article['entity_relationship']['triplet']]) or "无"
+    purified_triples = '\n'.join([f" + {t}" for t in purified['purified_triples']]) or "无"
+    tqdm.write("\n".join([
+        f"\n Article {article['article_id']}",
+        " 实体对比:",
+        f"原始实体: {json.dumps(article['entity_relationship']['entities'], ensure_ascii=False, indent=2)}",
+        f"提纯实体: {json.dumps(purified['purified_entities'], ensure_ascii=False, indent=2)}",
+        " 三元组对比:",
+        f"原始三元组:\n{original_triples}",
+        f"提纯三元组:\n{purified_triples}",
+        "─" * 50,
+    ]))
+    return {
+        "purified_entities": purified["purified_entities"],
+        "purified_triples": purified["purified_triples"]
+    }
+
+
+async def run_articles(data, result_store):
+    """并发提纯所有未处理的文章，完成的结果按输入顺序追加到结果日志"""
+    pending = []
     for article in data:
-        er = article.get('entity_relationship')
-        if er and isinstance(er, str):
-            try:
-                article['entity_relationship'] = json.loads(er)
-            except json.JSONDecodeError:
-                article['entity_relationship'] = {"entities": [], "triplet": []}
-
-    processed_count = 0
-    temp_data = []
-    pbar = tqdm(data, desc="Processing Articles", unit="article")
-
-    for idx, article in enumerate(pbar):
         # 跳过已处理文章
         if 'purified_entities' in article and 'purified_triples' in article:
             tqdm.write(f" 跳过已处理文章 {article['article_id']}")
             continue
+        pending.append(article)
+
+    semaphore = asyncio.Semaphore(CONFIG["max_concurrency"])
+    pbar = tqdm(total=len(pending), desc="Processing Articles", unit="article")
+    completed = {}
+    next_index = 0
+
+    def commit_ready():
+        # 只提交从 next_index 开始连续完成的文章，保证结果日志与输入顺序一致
+        nonlocal next_index
+        while next_index in completed:
+            article = pending[next_index]
+            article.update(completed.pop(next_index))
+            result_store.append(article["article_id"], {
+                "purified_entities": article["purified_entities"],
+                "purified_triples": article["purified_triples"]
+            })
+            next_index += 1
 
+    async def worker(index, article):
+        completed[index] = await process_article(article, semaphore)
+        pbar.update(1)
         pbar.set_postfix({"article_id": article["article_id"]})
+        commit_ready()
 
-        # 类型安全检查
-        if not isinstance(article.get('entity_relationship'), dict):
-            article['entity_relationship'] = {"entities": [], "triplet": []}
+    await asyncio.gather(*(worker(index, article) for index, article in enumerate(pending)))
+    pbar.close()
 
-        # 执行提纯
-        purified = purify_entities(article)
 
-        if purified:
-            # 合并结果
-            article.update({
-                "purified_entities": purified["purified_entities"],
-                "purified_triples": purified["purified_triples"]
-            })
+def process_articles():
+    """主处理流程"""
+    # 读取输入文件
+    with open(CONFIG["input_file"], 'r', encoding='utf-8') as f:
+        data = json.load(f)
 
-            # 输出对比信息
-            tqdm.write(f"\n Article {article['article_id']}")
-            tqdm.write(" 实体对比:")
-            tqdm.write(
-                f"原始实体: {json.dumps(article['entity_relationship']['entities'], ensure_ascii=False, indent=2)}")
-            tqdm.write(f"提纯实体: {json.dumps(purified['purified_entities'], ensure_ascii=False, indent=2)}")
-
-            tqdm.write(" 三元组对比:")
-            original_triples = '\n'.join([f" - {t}" for t in article['entity_relationship']['triplet']]) or "无"
-            purified_triples = '\n'.join([f" + {t}" for t in purified['purified_triples']]) or "无"
-            tqdm.write(f"原始三元组:\n{original_triples}")
-            tqdm.write(f"提纯三元组:\n{purified_triples}")
-            tqdm.write("─" * 50)
-        else:
-            article.update({
-                "purified_entities": {"enterprise": [], "person": [], "location": [], "project": []},
-                "purified_triples": []
-            })
+    # 数据预处理：统一为结构化结果，兼容旧版原样保存的模型输出字符串
+    for article in data:
+        article['entity_relationship'] = article_extraction(article)
 
-        temp_data.append(article)
-        processed_count += 1
+    # 从结果日志恢复已处理文章
+    result_store = ResultStore(CONFIG["output_file"], "article_id")
+    result_store.restore(data)
 
-        # 定期保存
-        if processed_count % CONFIG["save_interval"] == 0:
-            data[idx - len(temp_data) + 1: idx + 1] = temp_data
-            save_data(data, CONFIG["output_file"])
-            temp_data = []
+    asyncio.run(run_articles(data, result_store))
 
-    # 保存剩余数据
-    if temp_data:
-        data[len(data) - len(temp_data):] = temp_data
-        save_data(data, CONFIG["output_file"])
+    # 全部处理完成后一次性写出最终结果
+    result_store.compact(data, indent=2)
+    llm_cache.report()
+    rate_limiter.report()
+    triage_stats.report()
 
     print(f"\n🎉 处理完成！最终结果已保存至 {CONFIG['output_file']}")
 
 
 if __name__ == "__main__":
-    process_articles()
\ No newline at end of file
+    process_articles()
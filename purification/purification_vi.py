@@ -2,8 +2,16 @@
 import json
 import os
 import re
-from collections import defaultdict
+import sys
 from openai import OpenAI
+from triage import TriageStats, triage_extraction
+from voting import ConsistencyVoter, SamplingStats
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.extraction_result import article_extraction
+from common.llm_cache import LLMCache, cached_chat_completion, cached_chat_completions
+from common.rate_limiter import AdaptiveRateLimiter
+from common.result_store import ResultStore
 
 # 环境配置
 os.environ["OPENAI_API_KEY"] = ""
@@ -16,6 +24,15 @@ client = OpenAI(
     base_url=os.environ.get("OPENAI_BASE_URL"),
 )
 
+# LLM 响应缓存：每次采样单独缓存，重跑时复用已有采样结果
+llm_cache = LLMCache()
+# 自适应限速：遇到 429/5xx 时降速，成功时逐步提速
+rate_limiter = AdaptiveRateLimiter(initial_rate=5.0, max_rate=50.0, name="purification")
+# 记录每篇文章实际使用的采样次数
+sampling_stats = SamplingStats()
+# 记录规则预筛剔除的三元组与跳过模型调用的文章
+triage_stats = TriageStats()
+
 
 # 配置参数
 CONFIG = {
@@ -23,6 +40,8 @@ CONFIG = {
     "output_file": "",
     "sampling_times": 5,
     "consistency_threshold": 3,
+    # 逐次采样，所有候选项的投票结果都已确定时提前停止
+    "early_stopping": True,
     "allowed_relations": {
         'cooperation', 'lawsuit', 'investment', 'acquisition', 'branch',
         'legal_representative', 'executive', 'shareholder',
@@ -77,7 +96,7 @@ SYSTEM_PROMPT = f"""
 
 def validate_triple(triple):
     """验证三元组格式有效性"""
-    pattern = r"\(([^,]+?),\s*([^,]+?),\s*([^)]+?)\)"
+    pattern = r"\(((?:[^,()]|\([^,()]*\))+?),\s*([^,]+?),\s*((?:[^,()]|\([^,()]*\))+?)\)"
     if not re.fullmatch(pattern, triple):
         return False
     _, relation, _ = re.findall(pattern, triple)[0]
@@ -104,6 +123,18 @@ def parse_entities_from_response(text):
             entities["project"] = line.split(":")[1].split(",")
     return entities
 
+def sample_candidates(response_text, original_entities, original_triplets):
+    """将一次采样的响应与原始抽取结果合并为投票候选项"""
+    new_triples = [line.strip() for line in response_text.split("\n") if validate_triple(line.strip())]
+    new_entities = parse_entities_from_response(response_text)
+
+    candidates = [("triplet", triple) for triple in original_triplets + new_triples if validate_triple(triple)]
+    for entity_type in original_entities.keys() | new_entities.keys():
+        for entity in original_entities.get(entity_type, []) + new_entities.get(entity_type, []):
+            if entity.strip():
+                candidates.append((entity_type, entity.strip()))
+    return candidates
+
 def process_article(article):
     """处理单篇文章"""
     result = {
@@ -113,61 +144,70 @@ def process_article(article):
 
     try:
         content = article.get("content", "")
-        original_entities = article.get("entities", {})
-        original_triplets = article.get("triplet", [])
+        # 兼容顶层 entities/triplet 字段与抽取阶段写入的 entity_relationship，
+        # 并先按规则剔除空值、指代词以及关系或类型不匹配的三元组
+        extraction, dropped = triage_extraction(article_extraction(article), CONFIG["allowed_relations"])
+        settled = not extraction["triplet"]
+        triage_stats.record(extraction, dropped, settled)
+        original_entities = extraction["entities"]
+        original_triplets = extraction["triplet"]
 
         print("原始实体:")
         print(json.dumps(original_entities, ensure_ascii=False, indent=2))
         print("原始三元组:")
         print(json.dumps(original_triplets, ensure_ascii=False, indent=2))
 
-        triples_counter = defaultdict(int)
-        entities_counter = defaultdict(lambda: defaultdict(int))
-
-        for _ in range(CONFIG["sampling_times"]):
+        # 没有待验证的三元组时不调用模型
+        if settled:
+            print(f"规则预筛后没有待验证的三元组（剔除 {len(dropped)} 条），跳过模型调用")
+            result["purified_entities"] = original_entities
+            return result
+
+        # 逐次采样投票，候选项为 ("triplet", 三元组) 或 (实体类型, 实体)
+        voter = ConsistencyVoter(CONFIG["sampling_times"], CONFIG["consistency_threshold"])
+        request = dict(
+            rate_limiter=rate_limiter,
+            model="ep-20240926204940-gh2p7",
+            temperature=0.3,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": content},
+            ]
+        )
+        # 先一次取回 consistency_threshold 次采样（后端不支持或忽略 n 参数时改为并行请求），
+        # 之后每次追加一次采样，所有候选项都已确定时提前停止；失败的采样跳过，其余采样照常投票
+        first = CONFIG["consistency_threshold"] if CONFIG["early_stopping"] else CONFIG["sampling_times"]
+        responses = cached_chat_completions(client, llm_cache, first, **request)
+        while True:
+            for response_text in responses:
+                if response_text is None:
+                    voter.skip()
+                else:
+                    voter.add(sample_candidates(response_text, original_entities, original_triplets))
+            if voter.is_decided():
+                break
             try:
-                response = client.chat.completions.create(
-                    model="ep-20240926204940-gh2p7",
-                    temperature=0.3,
-                    messages=[
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": content},
-                    ]
-                )
-
-                new_triples = []
-                for line in response.choices[0].message.content.split("\n"):
-                    line = line.strip()
-                    if validate_triple(line):
-                        new_triples.append(line)
-
-                new_entities = parse_entities_from_response(response.choices[0].message.content)
-
-                for triple in set(original_triplets + new_triples):
-                    if validate_triple(triple):
-                        triples_counter[triple] += 1
-
-                for entity_type in original_entities.keys() | new_entities.keys():
-                    original_ents = original_entities.get(entity_type, [])
-                    new_ents = new_entities.get(entity_type, [])
-                    for entity in original_ents + new_ents:
-                        if entity.strip():
-                            entities_counter[entity_type][entity.strip()] += 1
-
+                responses = [cached_chat_completion(client, llm_cache, sample=voter.samples, **request)]
             except Exception as e:
                 print(f"API调用失败: {str(e)}")
+                responses = [None]
+        sampling_stats.record(voter.samples)
+        if not voter.successes:
+            # 所有采样都失败时不写入结果，下次运行重试
+            print("所有采样均失败，本次不保存结果")
+            return None
 
         result["purified_triples"] = [
-            triple for triple, count in triples_counter.items()
-            if count >= CONFIG["consistency_threshold"]
+            value for kind, value in voter.accepted() if kind == "triplet"
         ]
 
         purified_entities = {}
-        for entity_type, counter in entities_counter.items():
-            purified_entities[entity_type] = [
-                entity for entity, count in counter.items()
-                if count >= CONFIG["consistency_threshold"]
-            ]
+        for (kind, value), count in voter.results():
+            if kind == "triplet":
+                continue
+            purified_entities.setdefault(kind, [])
+            if count >= CONFIG["consistency_threshold"]:
+                purified_entities[kind].append(value)
         result["purified_entities"] = purified_entities
 
         print("提纯后的实体:")
@@ -191,6 +231,10 @@ def main():
         with open(CONFIG["input_file"], "r", encoding="utf-8") as f:
             dataset = json.load(f)
 
+    # 从结果日志恢复已处理文章
+    result_store = ResultStore(CONFIG["output_file"], "aid")
+    result_store.restore(dataset)
+
     # 处理数据
     for idx, article in enumerate(dataset):
         try:
@@ -201,21 +245,23 @@ def main():
                 continue
 
             result = process_article(article)
+            if result is None:
+                continue
             article.update(result)
 
-            # 每处理50条保存一次
-            if (idx + 1) % 50 == 0:
-                print(f"处理进度: {idx + 1}/{len(dataset)}")
-                with open(CONFIG["output_file"], "w", encoding="utf-8") as f:
-                    json.dump(dataset, f, ensure_ascii=False, indent=2)
+            # 每处理一篇文章追加一行结果日志
+            result_store.append(article["aid"], result)
 
         except Exception as e:
             print(f"处理文章 {article['aid']} 时发生错误: {str(e)}")
             continue
 
     # 最终保存
-    with open(CONFIG["output_file"], "w", encoding="utf-8") as f:
-        json.dump(dataset, f, ensure_ascii=False, indent=2)
+    result_store.compact(dataset, indent=2)
+    llm_cache.report()
+    rate_limiter.report()
+    sampling_stats.report(CONFIG["sampling_times"])
+    triage_stats.report()
     print("处理完成，结果已保存")
 
 if __name__ == "__main__":
@@ -0,0 +1,149 @@
+import re
+from collections import Counter
+
+# 三元组格式 "(主语, 关系, 宾语)"，与 validate_triple 一致；主语/宾语可以带一层成对的括号，如 "Công ty (VN) X"
+TRIPLE_PATTERN = re.compile(r"\(((?:[^,()]|\([^,()]*\))+?),\s*([^,]+?),\s*((?:[^,()]|\([^,()]*\))+?)\)")
+
+# 抽取提示词中出现的关系写法 -> 标准关系名
+RELATION_ALIASES = {
+    "partnership": "cooperation",
+    "litigation": "lawsuit",
+    "litigant": "lawsuit",
+    "litigants": "lawsuit",
+    "acquired": "acquisition",
+    "legal_representatives": "legal_representative",
+    "administrative_personnel": "executive",
+    "shareholders": "shareholder",
+    "participation": "participate",
+}
+
+# 关系允许的 (主语类型, 宾语类型)；人物与企业之间的关系两个方向都允许
+_ENTERPRISE_PAIR = {("enterprise", "enterprise")}
+_PERSON_ENTERPRISE = {("person", "enterprise"), ("enterprise", "person")}
+_ADDRESS = {("enterprise", "location"), ("person", "location"), ("project", "location")}
+_PROJECT = {("enterprise", "project"), ("project", "enterprise")}
+RELATION_TYPES = {
+    "cooperation": _ENTERPRISE_PAIR,
+    "lawsuit": _ENTERPRISE_PAIR | _PERSON_ENTERPRISE,
+    "investment": _ENTERPRISE_PAIR | _PROJECT,
+    "acquisition": _ENTERPRISE_PAIR,
+    "branch": _ENTERPRISE_PAIR,
+    "legal_representative": _PERSON_ENTERPRISE,
+    "executive": _PERSON_ENTERPRISE,
+    "shareholder": _PERSON_ENTERPRISE | _ENTERPRISE_PAIR,
+    "registered_address": _ADDRESS,
+    "branch_address": _ADDRESS,
+    "work_address": _ADDRESS,
+    "belong": _PROJECT,
+    "participate": _PROJECT | {("person", "project")},
+}
+
+# 股票代码式的大写缩写（如 SJC）：FPT、VNPT、PTT 等企业名与 USA、EU 等地名也是这种写法，
+# 因此不按规则剔除，只把不在企业/地点实体列表中的标记出来，交给模型判断
+TICKER_PATTERN = re.compile(r"^[A-Z]{2,5}$")
+TICKER_TYPES = ("enterprise", "location")
+# 空值
+NULL_VALUES = {"", "null", "none", "nan", "无", "空", "n/a"}
+# 指代词与泛称（中/英/越/泰），以及 "张某某" 这类匿名写法
+PRONOUNS = {
+    "he", "she", "it", "they", "him", "her", "them", "company", "the company", "this company",
+    "他", "她", "它", "他们", "其", "该公司", "本公司", "公司", "该企业", "企业",
+    "ông", "bà", "anh", "chị", "họ", "công ty", "doanh nghiệp",
+    "เขา", "เธอ", "พวกเขา", "บริษัท",
+}
+_ANONYMOUS_PATTERN = re.compile(r"某某|某$")
+
+
+def normalize_relation(relation):
+    """将关系名规范为标准写法，如 "legal representative" -> "legal_representative" """
+    key = re.sub(r"[\s\-]+", "_", relation.strip().lower())
+    return RELATION_ALIASES.get(key, key)
+
+
+def element_problem(text):
+    """检查三元组元素或实体，返回问题类型（null / pronoun），没有问题时返回 None"""
+    text = text.strip().strip("'\"")
+    if text.lower() in NULL_VALUES:
+        return "null"
+    if text.lower() in PRONOUNS or _ANONYMOUS_PATTERN.search(text):
+        return "pronoun"
+    return None
+
+
+def triage_extraction(extraction, allowed_relations):
+    """规则预筛抽取结果，返回 (清洗后的结果, [(被剔除的三元组, 原因)])
+
+    剔除空值、指代词实体；三元组还要求关系在白名单内，且主语/宾语在实体列表中的类型
+    与关系匹配（不在实体列表中的元素类型未知，保留给模型判断）。股票代码式的缩写不剔除，见 unlisted_tickers。
+    """
+    entities = {}
+    types_of = {}
+    for entity_type, names in extraction["entities"].items():
+        kept = []
+        for name in names:
+            name = name.strip()
+            if name and element_problem(name) is None and name not in kept:
+                kept.append(name)
+                types_of.setdefault(name, set()).add(entity_type)
+        entities[entity_type] = kept
+
+    triples, dropped = [], []
+    for triple in extraction["triplet"]:
+        match = TRIPLE_PATTERN.fullmatch(triple.strip())
+        if not match:
+            dropped.append((triple, "format"))
+            continue
+        subject, relation, obj = (part.strip() for part in match.groups())
+        problem = element_problem(subject) or element_problem(obj)
+        if problem:
+            dropped.append((triple, problem))
+            continue
+        relation = normalize_relation(relation)
+        if relation not in allowed_relations:
+            dropped.append((triple, "relation"))
+            continue
+        subject_types, object_types = types_of.get(subject), types_of.get(obj)
+        if subject_types and object_types and relation in RELATION_TYPES and not any(
+                (s, o) in RELATION_TYPES[relation] for s in subject_types for o in object_types):
+            dropped.append((triple, "type"))
+            continue
+        normalized = f"({subject}, {relation}, {obj})"
+        if normalized not in triples:
+            triples.append(normalized)
+    return {"entities": entities, "triplet": triples}, dropped
+
+
+def unlisted_tickers(extraction):
+    """返回含有股票代码式缩写、且该缩写不在企业/地点实体列表中的三元组，这些三元组保留给模型判断"""
+    listed = {name for entity_type in TICKER_TYPES for name in extraction["entities"].get(entity_type, [])}
+    flagged = []
+    for triple in extraction["triplet"]:
+        match = TRIPLE_PATTERN.fullmatch(triple)
+        if match and any(TICKER_PATTERN.match(part.strip()) and part.strip() not in listed
+                         for part in (match.group(1), match.group(3))):
+            flagged.append(triple)
+    return flagged
+
+
+class TriageStats:
+    """统计规则预筛的效果"""
+
+    def __init__(self):
+        self.articles = 0
+        self.settled_articles = 0
+        self.triples = 0
+        self.flagged = 0
+        self.dropped = Counter()
+
+    def record(self, extraction, dropped, settled):
+        self.articles += 1
+        self.settled_articles += settled
+        self.triples += len(extraction["triplet"]) + len(dropped)
+        self.flagged += len(unlisted_tickers(extraction))
+        self.dropped.update(reason for _, reason in dropped)
+
+    def report(self):
+        reasons = "，".join(f"{reason} {count}" for reason, count in self.dropped.most_common()) or "无"
+        print(f"规则预筛: {self.articles} 篇文章中 {self.settled_articles} 篇无需调用模型；"
+              f"三元组 {self.triples} 条，规则剔除 {sum(self.dropped.values())} 条（{reasons}），"
+              f"含未列为实体的大写缩写、交给模型判断 {self.flagged} 条")
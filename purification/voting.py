@@ -0,0 +1,77 @@
+import os
+import sys
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.text_normalize import canonical_key
+
+
+def candidate_key(candidate):
+    """候选项 (类型, 文本) 的计数键：文本取规范化键"""
+    kind, text = candidate
+    return kind, canonical_key(text)
+
+
+class ConsistencyVoter:
+    """一致性投票：候选项在 total 次采样中至少出现 threshold 次即通过
+
+    候选项按 key(candidate) 计数，同一键的不同写法合并投票，输出时取出现次数最多的写法。
+    采样逐次加入，所有候选项都已确定（已达到阈值，或剩余采样全部命中也达不到阈值）
+    且剩余采样数不足以让新出现的候选项达到阈值时，is_decided() 返回 True，可提前停止采样。
+    """
+
+    def __init__(self, total, threshold, key=candidate_key):
+        self.total = total
+        self.threshold = threshold
+        self.key = key
+        self.samples = 0
+        self.successes = 0
+        self.counts = {}
+        self._surfaces = {}
+
+    def add(self, candidates):
+        """加入一次采样中出现的候选项（同一采样内键相同的只计一次）"""
+        seen = set()
+        for candidate in candidates:
+            key = self.key(candidate)
+            self._surfaces.setdefault(key, Counter())[candidate] += 1
+            if key not in seen:
+                seen.add(key)
+                self.counts[key] = self.counts.get(key, 0) + 1
+        self.samples += 1
+        self.successes += 1
+
+    def skip(self):
+        """记录一次失败的采样：不投票，但占用一次采样名额"""
+        self.samples += 1
+
+    def is_decided(self):
+        remaining = self.total - self.samples
+        if remaining >= self.threshold:
+            return False
+        return all(count >= self.threshold or count + remaining < self.threshold
+                   for count in self.counts.values())
+
+    def results(self):
+        """按首次出现顺序返回 [(最常见写法, 票数)]"""
+        return [(self._surfaces[key].most_common(1)[0][0], count) for key, count in self.counts.items()]
+
+    def accepted(self):
+        return [candidate for candidate, count in self.results() if count >= self.threshold]
+
+
+class SamplingStats:
+    """统计每篇文章实际使用的采样次数"""
+
+    def __init__(self):
+        self.articles = 0
+        self.samples = 0
+
+    def record(self, samples):
+        self.articles += 1
+        self.samples += samples
+
+    def report(self, total):
+        average = self.samples / self.articles if self.articles else 0.0
+        print(f"一致性投票: {self.articles} 篇文章共采样 {self.samples} 次，"
+              f"平均每篇 {average:.2f} 次（上限 {total} 次）")